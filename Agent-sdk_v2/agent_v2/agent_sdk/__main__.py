@@ -0,0 +1,90 @@
+import argparse
+import os
+import signal
+import sys
+from .agent import Agent
+from .config import AgentConfig
+from .daemon import Daemon, DEFAULT_DAEMON_ADDRESS
+
+
+def _parse_args(argv):
+
+    parser = argparse.ArgumentParser(prog="agent-sdk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    daemon = commands.add_parser(
+        "daemon",
+        help="run the local forwarder that ships events for transport='daemon'"
+    )
+
+    # credentials default to the environment so they stay out of `ps`
+    daemon.add_argument("--api-key", default=os.environ.get("AGENT_API_KEY"))
+    daemon.add_argument("--api-secret", default=os.environ.get("AGENT_API_SECRET"))
+    daemon.add_argument("--endpoint", default=os.environ.get("AGENT_ENDPOINT"))
+    daemon.add_argument("--project", default=os.environ.get("AGENT_PROJECT"))
+    daemon.add_argument("--environment", default=os.environ.get("AGENT_ENVIRONMENT", "production"))
+
+    daemon.add_argument("--listen", default=DEFAULT_DAEMON_ADDRESS,
+                        help="udp://host:port or unix:///path (default: %(default)s)")
+    daemon.add_argument("--flush-interval", type=float, default=AgentConfig.flush_interval)
+    daemon.add_argument("--queue-capacity", type=int, default=100000)
+    daemon.add_argument("--compression", default=AgentConfig.compression)
+    daemon.add_argument("--spill-dir", default=None)
+
+    args = parser.parse_args(argv)
+
+    missing = [
+        name for name in ("api_key", "api_secret", "endpoint", "project")
+        if not getattr(args, name)
+    ]
+    if missing:
+        parser.error("missing " + ", ".join(
+            "--" + name.replace("_", "-") for name in missing
+        ))
+
+    return args
+
+
+def run_daemon(args):
+
+    # only the sender side of the agent, nothing to instrument here
+    Agent.init(
+        api_key=args.api_key,
+        api_secret=args.api_secret,
+        endpoint=args.endpoint,
+        project=args.project,
+        environment=args.environment,
+        enable_exceptions=False,
+        enable_http=False,
+        enable_logging=False,
+        queue_capacity=args.queue_capacity,
+        flush_interval=args.flush_interval,
+        compression=args.compression or None,
+        spill_dir=args.spill_dir,
+        handle_sigterm=False
+    )
+
+    daemon = Daemon(args.listen)
+    daemon.bind()
+
+    # SIGTERM behaves like Ctrl+C: stop receiving, flush what we have
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"agent-sdk daemon listening on {args.listen}", file=sys.stderr)
+
+    try:
+        daemon.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        daemon.close()
+        Agent.shutdown()
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.command == "daemon":
+        run_daemon(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import atexit
+import os
+import signal
+import threading
+import time
 from .config import AgentConfig
 from .sender import Sender
+from .queue import EventQueue
+from .sampling import Sampler
+from .spool import Spool
+from .overhead import Overhead
+from .event_builder import build_event
 from .exceptions import ExceptionTracker
-from .network import install_http_patch
-from .logging_capture import install_logging
+from .network import install_http_patch, install_http_clients
+from .logging_capture import install_logging, LogCapture, LogDedup
 
 
 class Agent:
@@ -26,7 +36,27 @@ class Agent:
         enable_exceptions: bool = True,
         enable_http: bool = True,
         enable_logging: bool = True,
-        enable_performance: bool = False
+        log_capture: str = "sync",
+        enable_performance: bool = False,
+        enable_metrics: bool = True,
+        enable_health: bool = True,
+
+        queue_capacity: int = 10000,
+        overflow_policy: str = "drop_oldest",
+        queue_sharded: bool = False,
+        shard_capacity: int | None = None,
+        flush_interval: float = 5.0,
+        http_pool_size: int = 4,
+        compression: str | None = "gzip",
+        spill_dir: str | None = None,
+        sample_rates: dict | None = None,
+        tail_sampling: bool = True,
+        transport: str = "thread",
+        daemon_address: str | None = None,
+        spool: bool = False,
+        spool_socket: str | None = None,
+        shutdown_timeout: float = 5.0,
+        handle_sigterm: bool = True
     ):
 
         if cls._initialized:
@@ -40,6 +70,39 @@ class Agent:
         AgentConfig.endpoint = endpoint
         AgentConfig.project = project
         AgentConfig.environment = environment
+        AgentConfig.metrics_enabled = enable_metrics
+        AgentConfig.health_enabled = enable_health
+
+        # ----------------------------
+        # Event Queue
+        # ----------------------------
+        AgentConfig.queue_capacity = queue_capacity
+        AgentConfig.overflow_policy = overflow_policy
+        AgentConfig.queue_sharded = queue_sharded
+        AgentConfig.shard_capacity = shard_capacity
+        AgentConfig.flush_interval = flush_interval
+        AgentConfig.http_pool_size = http_pool_size
+        AgentConfig.compression = compression
+        AgentConfig.spill_dir = spill_dir
+        AgentConfig.transport = transport
+        AgentConfig.daemon_address = daemon_address
+        EventQueue.configure()
+
+        # ----------------------------
+        # Sampling
+        # ----------------------------
+        AgentConfig.sample_rates = dict(sample_rates or {})
+        AgentConfig.tail_sampling = tail_sampling
+        if AgentConfig.sample_rates:
+            EventQueue.set_filter(Sampler.admit)
+
+        # ----------------------------
+        # Pre-fork Spool
+        # ----------------------------
+        AgentConfig.spool_enabled = spool
+        AgentConfig.spool_socket = spool_socket
+        if spool:
+            Spool.start()
 
         # ----------------------------
         # Install Core Modules
@@ -49,9 +112,11 @@ class Agent:
 
         if enable_http:
             install_http_patch()
+            install_http_clients()   # httpx / aiohttp / urllib3 when installed
 
         if enable_logging:
-            install_logging()
+            AgentConfig.log_capture = log_capture
+            install_logging(mode=log_capture)
 
         # ----------------------------
         # Framework Integration
@@ -93,7 +158,90 @@ class Agent:
         # ----------------------------
         # Start Background Sender
         # ----------------------------
-        Sender.start()
+        # "asyncio": AsyncSender runs on the app's event loop instead,
+        # started from the framework lifespan or AsyncSender.start()
+        if enable_health:
+            Sender.add_periodic(AgentConfig.health_interval, cls._ship_health)
+
+        if enable_logging and AgentConfig.log_dedup:
+            Sender.add_periodic(AgentConfig.log_dedup_window, LogDedup.sweep)
+
+        if transport != "asyncio":
+            Sender.start()
+
+        # ----------------------------
+        # Shutdown Flush
+        # ----------------------------
+        AgentConfig.shutdown_timeout = shutdown_timeout
+        atexit.register(cls.shutdown)
+        if handle_sigterm:
+            cls._install_sigterm_handler()
 
         cls._initialized = True
 
+    @classmethod
+    def stats(cls):
+        # what the SDK costs and how delivery is doing, see Overhead
+        return {
+            "overhead": Overhead.snapshot(),
+            "queue": EventQueue.stats(),
+            "delivery": Sender.delivery_stats(),
+            "connections": Sender.connection_stats(),
+            "logging": LogCapture.stats()
+        }
+
+    @classmethod
+    def _ship_health(cls):
+        event = build_event(
+            event_type="AGENT_HEALTH",
+            category="AGENT",
+            status="SUCCESS",
+            data=cls.stats()
+        )
+        EventQueue.push_raw(event)  # never sampled out
+
+    _shut_down = False
+
+    @classmethod
+    def shutdown(cls, timeout: float | None = None):
+
+        if cls._shut_down:
+            return True
+        cls._shut_down = True
+
+        if timeout is None:
+            timeout = AgentConfig.shutdown_timeout
+
+        try:
+            # records still in the log queue become events first
+            started = time.monotonic()
+            LogCapture.stop(min(1.0, timeout / 2))
+            LogDedup.sweep()
+            return Sender.shutdown(max(0.0, timeout - (time.monotonic() - started)))
+        except Exception:
+            return False  # never crash app
+
+    @classmethod
+    def _install_sigterm_handler(cls):
+
+        # only where nobody else handles it: servers such as gunicorn and
+        # uvicorn install their own and exit normally, which runs atexit
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+            return
+
+        def on_sigterm(signum, frame):
+            # The handler interrupts the main thread anywhere, possibly
+            # while it holds an SDK lock (log dedup, metrics, sampling),
+            # so the flush runs on its own thread; at worst it misses
+            # the deadline instead of deadlocking the process.
+            flusher = threading.Thread(target=cls.shutdown, daemon=True)
+            flusher.start()
+            flusher.join(AgentConfig.shutdown_timeout + 0.5)  # + spilling what missed it
+            # then die the way SIGTERM would have
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
@@ -0,0 +1,412 @@
+import asyncio
+import ssl
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from .config import AgentConfig
+from .queue import EventQueue
+from .sender import Sender
+from .metrics import MetricsAggregator
+from .overhead import Overhead
+
+try:
+    import httpx
+except ImportError:  # falls back to the raw asyncio stream client
+    httpx = None
+
+
+class StreamClient:
+
+    # Minimal HTTP/1.1 keep-alive client over asyncio streams, used when
+    # httpx is not installed. One connection, requests are serialized.
+
+    def __init__(self, endpoint):
+        parsed = urlparse(endpoint)
+        self.host = parsed.hostname
+        self.tls = parsed.scheme == "https"
+        self.port = parsed.port or (443 if self.tls else 80)
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += "?" + parsed.query
+
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host,
+            self.port,
+            ssl=ssl.create_default_context() if self.tls else None
+        )
+
+    async def post(self, data, headers):
+        async with self._lock:
+            # a stale keep-alive connection gets one reconnect
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._roundtrip(data, headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    await self.close()
+                    if attempt:
+                        raise
+
+    async def _roundtrip(self, data, headers):
+
+        head = [
+            f"POST {self.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(data)}",
+            "Connection: keep-alive"
+        ]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+
+        self._writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await self._writer.drain()
+
+        status_line = await self._reader.readuntil(b"\r\n")
+        status_code = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().title()] = value.strip()
+
+        # drain the body so the connection can be reused
+        if response_headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif "Content-Length" in response_headers:
+            await self._reader.readexactly(int(response_headers["Content-Length"]))
+        else:
+            await self._reader.read()
+            await self.close()
+
+        if response_headers.get("Connection", "").lower() == "close":
+            await self.close()
+
+        return status_code, response_headers
+
+    async def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+class HttpxClient:
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(
+            timeout=3,
+            limits=httpx.Limits(max_keepalive_connections=AgentConfig.http_pool_size)
+        )
+
+    async def post(self, data, headers):
+        response = await self._client.post(self.endpoint, content=data, headers=headers)
+        return response.status_code, response.headers
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class AsyncBuffer:
+
+    # Stands in for EventQueue's buffer while the asyncio transport runs.
+    # Pushes from the loop thread go straight into the asyncio.Queue,
+    # pushes from other threads hop over with call_soon_threadsafe.
+
+    def __init__(self, loop, capacity):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=capacity)
+        self.full = asyncio.Event()
+        self.thread_id = threading.get_ident()
+        self.dropped = 0
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        if self.queue.qsize() >= AgentConfig.flush_max_events:
+            self.full.set()
+
+    def push(self, event):
+        if threading.get_ident() == self.thread_id:
+            self._put(event)
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._put, event)
+            except RuntimeError:  # loop closed under a racing push
+                self.dropped += 1
+        return 0  # never trips the threaded sender's wake threshold
+
+    def drain(self, limit=None):
+        batch = []
+        while limit is None or len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    def stats(self):
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "overflow_policy": "drop_newest",
+            "dropped": self.dropped,
+            "spilled": 0,
+            "spill_bytes": 0
+        }
+
+
+class AsyncSender:
+
+    _buffer = None
+    _client = None
+    _task = None
+    _retry_tasks = set()
+    _healthy = True
+
+    @classmethod
+    def running(cls):
+        return cls._task is not None and not cls._task.done()
+
+    @classmethod
+    async def start(cls):
+
+        if cls.running():
+            return
+
+        loop = asyncio.get_running_loop()
+
+        # take over the queue, keeping anything captured so far
+        previous = EventQueue._buffer
+        cls._buffer = AsyncBuffer(loop, AgentConfig.queue_capacity)
+        for event in previous.drain():
+            cls._buffer.push(event)
+        EventQueue._buffer = cls._buffer
+
+        client_class = HttpxClient if httpx is not None else StreamClient
+        cls._client = client_class(AgentConfig.endpoint)
+        cls._task = loop.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls, timeout=5.0):
+
+        if cls._task is None:
+            return
+
+        task, cls._task = cls._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # hand the queue back before the loop closes: pushes from other
+        # threads must not reach call_soon_threadsafe on a closed loop.
+        # The sleep lets hops scheduled before the swap land first.
+        buffer = cls._buffer
+        EventQueue._buffer = EventQueue._new_buffer()
+        await asyncio.sleep(0)
+
+        # graceful flush: whatever is left goes out before the loop closes
+        try:
+            await asyncio.wait_for(cls._drain_all(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        # not sent in time: left for the threaded sender
+        for event in buffer.drain():
+            EventQueue._buffer.push(event)
+
+        for retry in list(cls._retry_tasks):
+            retry.cancel()
+
+        await cls._client.close()
+
+    @classmethod
+    async def _drain_all(cls):
+        batch = cls._buffer.drain()
+        if batch:
+            await cls._send_batch(batch, retry=False)
+        for body in await asyncio.to_thread(Sender._take_replay):
+            await cls._deliver(body, retry=False)
+        if MetricsAggregator.has_data():
+            await cls._deliver(Sender._summary_body(MetricsAggregator.snapshot()), retry=False)
+
+    @classmethod
+    async def _run(cls):
+
+        loop = asyncio.get_running_loop()
+        buffer = cls._buffer
+        next_summary = loop.time() + AgentConfig.metrics_interval
+
+        while True:
+            try:
+                # idle until the first event, but still run timed work on
+                # time (None = nothing timed, wait for events only)
+                timeout = Sender._until_next_wakeup()
+                if AgentConfig.metrics_enabled:
+                    summary_in = max(0, next_summary - loop.time())
+                    timeout = summary_in if timeout is None else min(timeout, summary_in)
+                try:
+                    first = await asyncio.wait_for(buffer.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    first = None
+
+                if first is not None:
+                    # then flush at flush_max_events or the latency deadline
+                    try:
+                        await asyncio.wait_for(buffer.full.wait(), AgentConfig.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    buffer.full.clear()
+
+                    await cls._send_batch([first] + buffer.drain())
+
+                if AgentConfig.metrics_enabled and loop.time() >= next_summary:
+                    next_summary = loop.time() + AgentConfig.metrics_interval
+                    if MetricsAggregator.has_data():
+                        await cls._deliver(
+                            Sender._summary_body(MetricsAggregator.snapshot())
+                        )
+
+                # periodic tasks (AGENT_HEALTH stats glob the spill
+                # directory) run off the loop; Sender.start() never
+                # registered its own here
+                if Sender._until_next_wakeup() == 0:
+                    await asyncio.to_thread(Sender._run_periodic)
+
+                # collector is reachable again: replay one spilled segment
+                if cls._healthy and not cls._retry_tasks:
+                    await cls._replay_spill()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(1)  # never spin on unexpected errors
+
+    @classmethod
+    async def _send_batch(cls, batch, retry=True):
+
+        if not AgentConfig.api_secret:
+            return
+
+        for body in Sender._encode_batch(batch):
+            await cls._deliver(body, retry)
+
+    @classmethod
+    async def _replay_spill(cls):
+
+        if not AgentConfig.api_secret:
+            return
+
+        # segment files are plain disk I/O, keep them off the loop
+        store = Sender._spill or await asyncio.to_thread(Sender._spill_store)
+        replay = Sender._replay
+        if replay is None:
+            if not await asyncio.to_thread(store.has_pending):
+                return
+
+            claimed, bodies = await asyncio.to_thread(store.claim)
+            if claimed is None:
+                return
+            replay = Sender._replay = [claimed, deque(bodies), 0]
+
+        # same per-pass limit as the threaded sender
+        bodies = replay[1]
+        for _ in range(AgentConfig.spill_replay_batches):
+            if not bodies:
+                break
+            if not await cls._deliver(bodies.popleft()):
+                break
+            replay[2] += 1
+            Sender._stats["batches_replayed"] += 1
+
+        if not bodies:
+            Sender._replay = None
+            await asyncio.to_thread(store.release, replay[0], replay[2])
+
+    @classmethod
+    async def _post(cls, body):
+
+        start = time.perf_counter_ns()
+        try:
+            # second pass only happens after a 415 renegotiation
+            for _ in range(2):
+                try:
+                    data, headers = Sender.prepare_request(body)
+                    status_code, response_headers = await cls._client.post(data, headers)
+
+                    if Sender.renegotiate(status_code, headers, response_headers):
+                        continue
+
+                    Overhead.add_bytes(len(body), len(data))
+                    return status_code < 500
+
+                except Exception:
+                    return False
+
+            return False
+
+        finally:
+            Overhead.record("send", time.perf_counter_ns() - start)
+
+    @classmethod
+    async def _deliver(cls, body, retry=True):
+
+        cls._healthy = await cls._post(body)
+        if cls._healthy:
+            Sender._stats["batches_sent"] += 1
+            return True
+
+        Sender._stats["send_failures"] += 1
+
+        if retry and len(cls._retry_tasks) < AgentConfig.max_pending_retries:
+            # back off in its own task so new batches keep flowing
+            task = asyncio.get_running_loop().create_task(cls._retry(body))
+            cls._retry_tasks.add(task)
+            task.add_done_callback(cls._retry_tasks.discard)
+            Sender._stats["retries_scheduled"] += 1
+        elif await cls._spill(body):
+            Sender._stats["batches_spilled"] += 1
+
+        return False
+
+    @classmethod
+    async def _retry(cls, body):
+
+        for attempt in range(1, Sender.RETRY_LIMIT):
+            await asyncio.sleep(Sender.BASE_BACKOFF * (2 ** (attempt - 1)))
+            if await cls._post(body):
+                Sender._stats["batches_sent"] += 1
+                return
+            Sender._stats["send_failures"] += 1
+
+        if await cls._spill(body):
+            Sender._stats["batches_spilled"] += 1
+
+    @staticmethod
+    async def _spill(body):
+        # segment files are plain disk I/O, keep them off the loop
+        return await asyncio.to_thread(Sender._spill_store().append, body)
@@ -0,0 +1,46 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install agent-telemetry-sdk[zstd]
+    zstandard = None
+
+
+def available_encodings():
+    # best ratio / speed first
+    if zstandard is not None:
+        return ["zstd", "gzip"]
+    return ["gzip"]
+
+
+# preferred comes from AgentConfig.compression, accepted is the collector's
+# Accept-Encoding header once it has advertised one. None = send identity.
+def choose_encoding(preferred, accepted=None):
+
+    if not preferred:
+        return None
+
+    candidates = available_encodings()
+    if preferred in candidates:
+        candidates.remove(preferred)
+        candidates.insert(0, preferred)
+
+    if accepted is not None:
+        allowed = {
+            part.split(";")[0].strip().lower()
+            for part in accepted.split(",")
+        }
+        candidates = [c for c in candidates if c in allowed]
+
+    return candidates[0] if candidates else None
+
+
+def compress(body: bytes, encoding):
+
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+
+    return body
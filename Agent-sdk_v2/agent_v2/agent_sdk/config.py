@@ -5,4 +5,73 @@ class AgentConfig:
     project: str = None
     environment: str = "production"
     sdk_version: str = "2.0.0"
-    schema_version: str = "1.0"
+    schema_version: str = "2.0"            # "1.0" = identity/meta inline per event
+
+    # Event queue (bounded ring buffer)
+    queue_capacity: int = 10000
+    overflow_policy: str = "drop_oldest"   # drop_oldest | drop_newest | sample | spill
+    overflow_sample_rate: float = 0.1      # share of overflow kept by "sample"
+    # "spill" policy: events that do not fit in the queue go to a file of
+    # this process (temp dir by default) and are replayed into the queue
+    spill_path: str = None
+    spill_max_bytes: int = 50 * 1024 * 1024
+    queue_sharded: bool = False            # per-thread buffers merged at flush
+    shard_capacity: int = None             # per-thread bound in sharded mode, None
+                                           # splits queue_capacity across threads
+
+    # Sender flush scheduling (whichever limit is hit first)
+    flush_interval: float = 5.0            # max seconds an event waits
+    flush_max_events: int = 500            # wake the sender at this depth
+    flush_max_bytes: int = 512 * 1024      # ... or this estimated payload size
+    max_batch_events: int = 1000           # collector answers 413 above this
+    max_batch_bytes: int = 2 * 1024 * 1024
+
+    # Sender HTTP transport
+    transport: str = "thread"              # thread | asyncio (AsyncSender on the app loop) | daemon
+                                           # (events are still serialized in the app process)
+    daemon_address: str = None             # unix socket in the temp dir by default, or udp://host:port
+    http_pool_size: int = 4               # keep-alive connections to the collector
+    compression: str = "gzip"              # gzip | zstd (extra) | None
+    compression_min_bytes: int = 1024      # smaller bodies go uncompressed
+
+    # Process exit: drain the queue, give up (and spill) at the deadline
+    shutdown_timeout: float = 5.0
+
+    # Failed batches: non-blocking retries, then durable spill segments.
+    # Unlike spill_path (queue overflow, replayed into the queue), these
+    # are encoded bodies the collector did not take, shared by every
+    # process on the host and posted again once it is reachable.
+    max_pending_retries: int = 32          # in-memory bodies awaiting backoff
+    spill_dir: str = None                  # temp dir by default, one subdir per endpoint + key
+    spill_dir_max_bytes: int = 100 * 1024 * 1024
+    spill_segment_bytes: int = 4 * 1024 * 1024
+    spill_replay_batches: int = 10         # bodies replayed per sender pass
+
+    # Sampling: head rates per event type, tail keeps failed requests whole
+    sample_rates: dict = {}                # e.g. {"DB_QUERY": 0.1}
+    tail_sampling: bool = True
+    max_held_per_request: int = 256
+
+    # Pre-fork servers: one forwarder per host ships for all workers
+    spool_enabled: bool = False
+    spool_socket: str = None               # unix socket, temp dir by default
+
+    # Log capture: sanitize / render tracebacks in the sender thread
+    log_deferred: bool = True
+    log_capture: str = "sync"              # sync | queue (QueueHandler + listener thread)
+    log_queue_size: int = 10000            # queue mode, records beyond are dropped
+    log_dedup: bool = True                 # token bucket per logger/level/template/line
+    log_burst: int = 10                    # events a key may send at once
+    log_rate: float = 1.0                  # ... then per second, the rest are counted
+    log_dedup_window: float = 10.0         # seconds per repeat_count summary
+    log_dedup_max_keys: int = 1000
+
+    # Pre-aggregated latency histograms per route / query
+    metrics_enabled: bool = True
+    metrics_interval: float = 10.0         # seconds per summary window
+    outbound_max_routes: int = 500         # (host, route, status class) keys per window
+    http_call_events: bool = False         # successful outbound calls as HTTP_CALL events too
+
+    # Self-telemetry: Agent.stats() shipped as an AGENT_HEALTH event
+    health_enabled: bool = True
+    health_interval: float = 60.0
@@ -0,0 +1,232 @@
+import os
+import socket
+import tempfile
+from pathlib import Path
+from urllib.parse import urlparse
+from .config import AgentConfig
+from .sampling import Sampler
+from .spool import tag_forwarded, ingest_frame
+from . import serializer
+
+
+# unix datagrams push back on a busy daemon, UDP silently drops bursts
+DEFAULT_DAEMON_ADDRESS = "unix://" + str(Path(tempfile.gettempdir()) / "agent_sdk_daemon.sock")
+MAX_DATAGRAM_BYTES = 60000      # fits a single localhost UDP datagram
+RECEIVE_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+# "udp://host:port" or "unix:///path/to/socket" -> (family, sockaddr)
+def parse_address(address):
+
+    parsed = urlparse(address or DEFAULT_DAEMON_ADDRESS)
+
+    if parsed.scheme == "unix":
+        return socket.AF_UNIX, parsed.path
+
+    if parsed.scheme == "udp":
+        return socket.AF_INET, (parsed.hostname or "127.0.0.1", parsed.port or 8126)
+
+    raise ValueError(f"Unsupported daemon address: {address}")
+
+
+# One JSON object per datagram: {"events": [...]} / {"summaries": [...]}
+# / {"sampled_out": {...}}, split so no datagram exceeds MAX_DATAGRAM_BYTES.
+def pack_datagrams(key, records):
+
+    head = b'{"' + key.encode() + b'":['
+    room = MAX_DATAGRAM_BYTES - len(head) - 2
+
+    datagrams, current, size, oversized = [], [], 0, 0
+    for record in records:
+        if len(record) > room:
+            oversized += 1
+            continue
+        if current and size + len(record) + 1 > room:
+            datagrams.append((head + b",".join(current) + b"]}", len(current)))
+            current, size = [], 0
+        current.append(record)
+        size += len(record) + 1
+
+    if current:
+        datagrams.append((head + b",".join(current) + b"]}", len(current)))
+
+    return datagrams, oversized
+
+
+class DaemonClient:
+
+    # Application side of transport="daemon": the sender thread still
+    # serializes flushed events in the app process, packs them into
+    # datagrams and hands them to the local daemon on a non-blocking
+    # socket. A datagram the daemon has no room for is dropped, never
+    # waited on. Compression, signing and retries happen in the daemon.
+    #
+    # UDP reports a dead daemon only on the send after the lost one, so
+    # a new socket first sends an empty probe (which localhost refuses at
+    # once), and a later refusal counts the previous forward as lost.
+
+    _sock = None
+    _unconfirmed = 0   # events of the last forward, lost if the next send is refused
+
+    _stats = {
+        "datagrams_sent": 0,
+        "events_sent": 0,
+        "events_dropped": 0,
+        "refused": 0
+    }
+
+    @classmethod
+    def _socket(cls):
+
+        if cls._sock is not None:
+            return cls._sock
+
+        family, address = parse_address(AgentConfig.daemon_address)
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            # connected, so a missing daemon surfaces as an error on send
+            sock.connect(address)
+            sock.setblocking(False)
+            if family == socket.AF_INET:
+                sock.send(b"")
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    raise ConnectionRefusedError(error, os.strerror(error))
+        except OSError:
+            sock.close()
+            return None
+
+        cls._sock = sock
+        cls._unconfirmed = 0
+        return sock
+
+    @classmethod
+    def _reset(cls):
+        sock, cls._sock = cls._sock, None
+        if sock is not None:
+            sock.close()
+
+    # False = the daemon is unreachable and nothing was sent
+    @classmethod
+    def forward(cls, events=(), summaries=None):
+
+        sock = cls._socket()
+        if sock is None:
+            return False
+
+        events_out, oversized = pack_datagrams(
+            "events", [serializer.dumps(tag_forwarded(event)) for event in events]
+        )
+        summaries_out, _ = pack_datagrams(
+            "summaries", [serializer.dumps(summary) for summary in summaries or ()]
+        )
+
+        sampled_out = Sampler.drain_dropped()
+        extra = [(serializer.dumps({"sampled_out": sampled_out}), 0)] if sampled_out else []
+
+        cls._stats["events_dropped"] += oversized
+        sent_any = False
+
+        for datagram, count in events_out + summaries_out + extra:
+            try:
+                sock.send(datagram)
+            except BlockingIOError:
+                # daemon is behind (EAGAIN): drop rather than stall the sender
+                cls._stats["events_dropped"] += count
+                continue
+            except OSError as e:
+                if isinstance(e, ConnectionRefusedError):
+                    # UDP: what the last forward sent never arrived
+                    cls._stats["refused"] += 1
+                    cls._stats["events_dropped"] += cls._unconfirmed
+                    cls._stats["events_sent"] -= cls._unconfirmed
+                cls._reset()
+                if not sent_any:
+                    Sampler.add_dropped(sampled_out)
+                    return False
+                cls._stats["events_dropped"] += count
+                continue
+
+            if not sent_any:
+                cls._unconfirmed = 0
+            sent_any = True
+            cls._unconfirmed += count
+            cls._stats["datagrams_sent"] += 1
+            cls._stats["events_sent"] += count
+
+        return True
+
+    @classmethod
+    def stats(cls):
+        return dict(cls._stats)
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls._sock = None  # the parent's socket, leave it open
+        cls._unconfirmed = 0
+        cls._stats = dict.fromkeys(cls._stats, 0)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=DaemonClient._after_fork_in_child)
+
+
+class Daemon:
+
+    # Local forwarder: receives datagrams from DaemonClient and ships them
+    # through the regular Sender (batching, compression, signing, retry
+    # and spill). Run it with `agent-sdk daemon` / `python -m agent_sdk`.
+
+    def __init__(self, address=None):
+        self.address = address or DEFAULT_DAEMON_ADDRESS
+        self.received = 0
+        self.malformed = 0
+        self._sock = None
+
+    def bind(self):
+
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+
+        if family == socket.AF_UNIX:
+            try:
+                os.unlink(address)
+            except FileNotFoundError:
+                pass
+
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_BYTES)
+        except OSError:
+            pass
+
+        sock.bind(address)
+        self._sock = sock
+        return sock
+
+    def serve_forever(self):
+
+        sock = self._sock or self.bind()
+
+        while True:
+            data = sock.recv(MAX_DATAGRAM_BYTES + 1024)
+            if not data:
+                continue  # a client's reachability probe
+            try:
+                self.received += ingest_frame(serializer.loads(data))
+            except Exception:
+                self.malformed += 1
+
+    def close(self):
+
+        if self._sock is None:
+            return
+
+        family, address = parse_address(self.address)
+        self._sock.close()
+        self._sock = None
+
+        if family == socket.AF_UNIX:
+            try:
+                os.unlink(address)
+            except OSError:
+                pass
@@ -2,6 +2,7 @@ import time
 from sqlalchemy import event
 from .event_builder import build_event
 from .queue import EventQueue
+from .metrics import MetricsAggregator
 
 
 def extract_query_type(statement):
@@ -29,13 +30,14 @@ def install_sqlalchemy_monitor(engine):
     @event.listens_for(engine, "after_cursor_execute")
     def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
 
-        duration_ms = int(
-            (time.time() - context._query_start_time) * 1000
-        )
+        elapsed_ms = (time.time() - context._query_start_time) * 1000
+        duration_ms = int(elapsed_ms)
 
         query_type = extract_query_type(statement)
         table = extract_table_name(statement)
 
+        MetricsAggregator.record_query(query_type, table, elapsed_ms)
+
         event_obj = build_event(
             event_type="DB_QUERY",
             category="DATABASE",
@@ -54,15 +56,16 @@ def install_sqlalchemy_monitor(engine):
     @event.listens_for(engine, "handle_error")
     def handle_error(context):
 
-        duration_ms = 0
+        elapsed_ms = 0
         if hasattr(context, "_query_start_time"):
-            duration_ms = int(
-                (time.time() - context._query_start_time) * 1000
-            )
+            elapsed_ms = (time.time() - context._query_start_time) * 1000
+        duration_ms = int(elapsed_ms)
 
         query_type = extract_query_type(context.statement)
         table = extract_table_name(context.statement)
 
+        MetricsAggregator.record_query(query_type, table, elapsed_ms, error=True)
+
         event_obj = build_event(
             event_type="DB_ERROR",
             category="DATABASE",
@@ -1,35 +1,131 @@
+import itertools
+import os
+import random
+import time
 import uuid
 from datetime import datetime, timezone
 from .config import AgentConfig
 from .identity import Identity
 from .severity import get_severity
+from .overhead import Overhead, SAMPLE_EVERY
 
 
 def current_utc():
     return datetime.now(timezone.utc).isoformat()
 
 
-def build_event(event_type, category, status, data, metrics=None):
+# Trace ids: random 64-bit per-process prefix + 64-bit counter. next() on
+# itertools.count is atomic, so ids are unique without a lock or a
+# uuid4() call on the request path.
+_trace_prefix = random.getrandbits(64) << 64
+_trace_counter = itertools.count(1)
 
-    return {
-        "meta": {
-            "sdk_version": AgentConfig.sdk_version,
-            "schema_version": AgentConfig.schema_version,
-            "timestamp": current_utc(),
-            "trace_id": str(uuid.uuid4()),
-            "project": AgentConfig.project,
-            "environment": AgentConfig.environment
-        },
 
-        "identity": Identity.collect(),
+def _reseed_trace_ids():
+    global _trace_prefix, _trace_counter
+    _trace_prefix = random.getrandbits(64) << 64
+    _trace_counter = itertools.count(1)
 
-        "event": {
-            "category": category,
-            "type": event_type,
-            "severity": get_severity(event_type),
-            "status": status,
-            "metrics": metrics or {},
-            "data": data
+
+if hasattr(os, "register_at_fork"):
+    # forked workers must not replay the parent's id sequence
+    os.register_at_fork(after_in_child=_reseed_trace_ids)
+
+
+def next_trace_id():
+    return _trace_prefix | next(_trace_counter)
+
+
+def format_timestamp(ts_ns):
+    seconds, nanos = divmod(ts_ns, 1_000_000_000)
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(
+        microsecond=nanos // 1000
+    ).isoformat()
+
+
+def format_trace_id(trace_id):
+    return str(uuid.UUID(int=trace_id & ((1 << 128) - 1)))
+
+
+class Event:
+
+    # Raw values captured on the request path (time_ns, int trace id).
+    # The nested wire dict, ISO timestamp and UUID string are only built
+    # by to_dict(), which the serializer calls in the sender thread.
+    # Event types / categories are passed as string literals, which
+    # CPython already interns.
+    __slots__ = (
+        "timestamp",
+        "trace_id",
+        "event_type",
+        "category",
+        "status",
+        "severity",
+        "metrics",
+        "data",
+        "sample_rate"
+    )
+
+    def __init__(self, event_type, category, status, data, metrics=None, severity=None):
+        self.timestamp = time.time_ns()
+        self.trace_id = next_trace_id()
+        self.event_type = event_type
+        self.category = category
+        self.status = status
+        self.severity = severity
+        self.metrics = metrics
+        self.data = data
+        self.sample_rate = 1.0
+
+    def to_dict(self):
+
+        meta = {
+            "timestamp": format_timestamp(self.timestamp),
+            "trace_id": format_trace_id(self.trace_id)
         }
-    }
 
+        event = {
+            "category": self.category,
+            "type": self.event_type,
+            "severity": self.severity or get_severity(self.event_type),
+            "status": self.status,
+            "metrics": self.metrics or {},
+            "data": self.data
+        }
+
+        # head-sampled: the backend weights this event by 1 / sample_rate
+        if self.sample_rate != 1.0:
+            event["sample_rate"] = self.sample_rate
+
+        # schema 2.0: identity and constant meta travel once per batch
+        # (see Sender._build_body), events only carry per-event fields
+        if AgentConfig.schema_version != "1.0":
+            return {"meta": meta, "event": event}
+
+        return {
+            "meta": {
+                "sdk_version": AgentConfig.sdk_version,
+                "schema_version": AgentConfig.schema_version,
+                **meta,
+                "project": AgentConfig.project,
+                "environment": AgentConfig.environment
+            },
+
+            "identity": Identity.collect(),
+
+            "event": event
+        }
+
+
+_build_tick = itertools.count()
+
+
+def build_event(event_type, category, status, data, metrics=None, severity=None):
+
+    if next(_build_tick) % SAMPLE_EVERY:
+        return Event(event_type, category, status, data, metrics, severity)
+
+    start = time.perf_counter_ns()
+    event = Event(event_type, category, status, data, metrics, severity)
+    Overhead.record("build_event", time.perf_counter_ns() - start, SAMPLE_EVERY)
+    return event
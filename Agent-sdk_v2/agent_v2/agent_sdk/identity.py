@@ -47,4 +47,12 @@ class Identity:
             identity["process_id"] = os.getpid()
 
         cls._cached_identity = identity
-        return identity
\ No newline at end of file
+        return identity
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls._cached_identity = None  # process_id changed
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Identity._after_fork_in_child)
@@ -0,0 +1,148 @@
+import time
+import aiohttp
+from ..network import (
+    StreamedSize,
+    is_internal_host,
+    record_http,
+    record_http_exception
+)
+
+
+_original_init = None
+_trace_config = None
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter_ns() - started) / 1e6, 3)
+
+
+# ----------------------------
+# Trace hooks (ctx is per request)
+# ----------------------------
+async def _on_request_start(session, ctx, params):
+    url = params.url
+    ctx.skip = is_internal_host(url.scheme, url.host, url.port)
+    # the URL asked for: params.url is the final one after redirects
+    ctx.url = url
+    ctx.start = time.perf_counter_ns()
+    ctx.timings = {}
+    ctx.marks = {}
+    ctx.size = None
+
+
+async def _on_dns_resolvehost_start(session, ctx, params):
+    ctx.marks["dns"] = time.perf_counter_ns()
+
+
+async def _on_dns_resolvehost_end(session, ctx, params):
+    started = ctx.marks.pop("dns", None)
+    if started is not None:
+        ctx.timings["dns_ms"] = _elapsed_ms(started)
+
+
+async def _on_connection_create_start(session, ctx, params):
+    ctx.marks["connect"] = time.perf_counter_ns()
+
+
+async def _on_connection_create_end(session, ctx, params):
+    started = ctx.marks.pop("connect", None)
+    if started is not None:
+        # resolving (and the TLS handshake) is part of creating the
+        # connection here
+        ctx.timings["connect_ms"] = round(
+            _elapsed_ms(started) - ctx.timings.get("dns_ms", 0.0), 3
+        )
+
+
+async def _on_request_headers_sent(session, ctx, params):
+    ctx.marks["sent"] = time.perf_counter_ns()
+
+
+async def _on_request_end(session, ctx, params):
+    # fired once the response headers are in, before the body is read
+
+    if ctx.skip:
+        return
+
+    try:
+        sent = ctx.marks.get("sent")
+        if sent is not None:
+            ctx.timings["ttfb_ms"] = _elapsed_ms(sent)
+
+        response = params.response
+        size = None
+        if response.status >= 400:
+            size = response.content_length
+            if size is None:
+                # counted by _on_response_chunk_received as the caller reads
+                size = ctx.size = StreamedSize()
+
+        record_http(
+            params.method,
+            ctx.url,
+            response.status,
+            ctx.start,
+            size,
+            ctx.timings
+        )
+
+    except Exception:
+        pass  # never crash app
+
+
+async def _on_response_chunk_received(session, ctx, params):
+    if ctx.size is not None:
+        ctx.size.count(params.chunk)
+
+
+async def _on_request_exception(session, ctx, params):
+
+    if ctx.skip:
+        return
+
+    try:
+        record_http_exception(
+            params.method,
+            ctx.url,
+            params.exception,
+            ctx.start,
+            ctx.timings
+        )
+    except Exception:
+        pass  # never crash app
+
+
+def agent_trace_config():
+
+    global _trace_config
+
+    if _trace_config is None:
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(_on_request_start)
+        config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+        config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+        config.on_connection_create_start.append(_on_connection_create_start)
+        config.on_connection_create_end.append(_on_connection_create_end)
+        config.on_request_headers_sent.append(_on_request_headers_sent)
+        config.on_request_end.append(_on_request_end)
+        config.on_response_chunk_received.append(_on_response_chunk_received)
+        config.on_request_exception.append(_on_request_exception)
+        _trace_config = config
+
+    return _trace_config
+
+
+def install_aiohttp():
+    global _original_init
+
+    if _original_init is not None:
+        return  # Already patched
+
+    _original_init = aiohttp.ClientSession.__init__
+
+    # every session gets the agent's trace config next to its own
+    def __init__(self, *args, trace_configs=None, **kwargs):
+        trace_configs = [*(trace_configs or ()), agent_trace_config()]
+        _original_init(self, *args, trace_configs=trace_configs, **kwargs)
+
+    aiohttp.ClientSession.__init__ = __init__
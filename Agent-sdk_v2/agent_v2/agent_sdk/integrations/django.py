@@ -1,6 +1,14 @@
 import time
 from ..event_builder import build_event
 from ..queue import EventQueue
+from ..sampling import Sampler
+from ..metrics import MetricsAggregator
+
+
+# "items/<int:item_id>" instead of every concrete path
+def route_template(request):
+    match = getattr(request, "resolver_match", None)
+    return getattr(match, "route", None) or request.path
 
 
 class AgentDjangoMiddleware:
@@ -11,13 +19,19 @@ class AgentDjangoMiddleware:
     def __call__(self, request):
 
         start_time = time.time()
+        sampling_token = Sampler.begin_request()
 
         try:
             response = self.get_response(request)
-            duration_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = (time.time() - start_time) * 1000
+            duration_ms = int(elapsed_ms)
 
             status_code = response.status_code
 
+            MetricsAggregator.record_request(
+                route_template(request), request.method, status_code, elapsed_ms
+            )
+
             # Classification
             if status_code >= 500:
                 event_type = "SERVER_ERROR"
@@ -48,7 +62,12 @@ class AgentDjangoMiddleware:
             return response
 
         except Exception as e:
-            duration_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = (time.time() - start_time) * 1000
+            duration_ms = int(elapsed_ms)
+
+            MetricsAggregator.record_request(
+                route_template(request), request.method, None, elapsed_ms
+            )
 
             event = build_event(
                 event_type="SERVER_ERROR",
@@ -68,3 +87,6 @@ class AgentDjangoMiddleware:
             EventQueue.push(event)
 
             raise
+
+        finally:
+            Sampler.end_request(sampling_token)
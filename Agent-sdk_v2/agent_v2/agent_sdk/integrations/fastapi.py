@@ -1,8 +1,13 @@
 import time
+from contextlib import asynccontextmanager
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from ..event_builder import build_event
 from ..queue import EventQueue
+from ..sampling import Sampler
+from ..metrics import MetricsAggregator
+from ..config import AgentConfig
+from ..async_sender import AsyncSender
 
 
 # ✅ safe exception sanitizer
@@ -12,18 +17,34 @@ def sanitize_exception(msg: str, limit: int = 120):
     return msg[:limit]
 
 
+# "/items/{item_id}" instead of every concrete path
+def route_template(request: Request):
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or request.url.path
+
+
 class AgentFastAPIMiddleware(BaseHTTPMiddleware):
 
     async def dispatch(self, request: Request, call_next):
 
+        # fallback when the app's lifespan never ran (e.g. lifespan="off")
+        if AgentConfig.transport == "asyncio" and not AsyncSender.running():
+            await AsyncSender.start()
+
         start_time = time.time()
+        sampling_token = Sampler.begin_request()
 
         try:
             response = await call_next(request)
-            duration_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = (time.time() - start_time) * 1000
+            duration_ms = int(elapsed_ms)
 
             status_code = response.status_code
 
+            MetricsAggregator.record_request(
+                route_template(request), request.method, status_code, elapsed_ms
+            )
+
             # Classification
             if status_code >= 500:
                 event_type = "SERVER_ERROR"
@@ -54,7 +75,12 @@ class AgentFastAPIMiddleware(BaseHTTPMiddleware):
             return response
 
         except Exception as e:
-            duration_ms = int((time.time() - start_time) * 1000)
+            elapsed_ms = (time.time() - start_time) * 1000
+            duration_ms = int(elapsed_ms)
+
+            MetricsAggregator.record_request(
+                route_template(request), request.method, None, elapsed_ms
+            )
 
             event = build_event(
                 event_type="SERVER_ERROR",
@@ -75,6 +101,28 @@ class AgentFastAPIMiddleware(BaseHTTPMiddleware):
 
             raise
 
+        finally:
+            Sampler.end_request(sampling_token)
+
+
+def _wrap_lifespan(app):
+
+    lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def agent_lifespan(app_):
+        await AsyncSender.start()
+        try:
+            async with lifespan(app_) as state:
+                yield state
+        finally:
+            await AsyncSender.stop()
+
+    app.router.lifespan_context = agent_lifespan
+
 
 def init_fastapi(app):
-    app.add_middleware(AgentFastAPIMiddleware)
\ No newline at end of file
+    app.add_middleware(AgentFastAPIMiddleware)
+
+    if AgentConfig.transport == "asyncio":
+        _wrap_lifespan(app)
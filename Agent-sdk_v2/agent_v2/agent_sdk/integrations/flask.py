@@ -2,6 +2,8 @@ import time
 from flask import request, g
 from ..event_builder import build_event
 from ..queue import EventQueue
+from ..sampling import Sampler
+from ..metrics import MetricsAggregator
 
 
 def init_flask(app):
@@ -9,17 +11,25 @@ def init_flask(app):
     @app.before_request
     def _start_timer():
         g._agent_start_time = time.time()
+        g._agent_sampling_token = Sampler.begin_request()
 
     @app.after_request
     def _log_request(response):
 
         try:
-            duration_ms = int(
-                (time.time() - g._agent_start_time) * 1000
-            )
+            elapsed_ms = (time.time() - g._agent_start_time) * 1000
+            duration_ms = int(elapsed_ms)
 
             status_code = response.status_code
 
+            # route template keeps the summary cardinality bounded
+            MetricsAggregator.record_request(
+                request.url_rule.rule if request.url_rule else request.path,
+                request.method,
+                status_code,
+                elapsed_ms
+            )
+
             # Classification
             if status_code >= 500:
                 event_type = "SERVER_ERROR"
@@ -56,8 +66,16 @@ def init_flask(app):
     @app.teardown_request
     def _log_exception(exc):
 
-        if exc is None:
-            return
+        try:
+            if exc is not None:
+                _push_exception(exc)
+        finally:
+            # tail sampling decision for everything this request produced
+            token = g.pop("_agent_sampling_token", None)
+            if token is not None:
+                Sampler.end_request(token)
+
+    def _push_exception(exc):
 
         try:
             duration_ms = int(
@@ -0,0 +1,236 @@
+import time
+import httpx
+from ..network import (
+    StreamedSize,
+    add_timing,
+    begin_http_call,
+    content_length,
+    current_timings,
+    end_http_call,
+    is_internal_host,
+    mark_headers,
+    record_http,
+    record_http_exception
+)
+
+
+_original_send = None
+_original_send_async = None
+_original_handle = None
+_original_handle_async = None
+
+
+class _Trace:
+
+    # Fed by httpcore's "trace" request extension, once per transport
+    # hop, and added to the enclosing call's phases (summed over
+    # redirects). httpcore resolves DNS inside connect_tcp, so there is
+    # no separate dns_ms here.
+
+    __slots__ = ("marks",)
+
+    PHASES = {
+        "connect_tcp": "connect_ms",
+        "connect_unix_socket": "connect_ms",
+        "start_tls": "tls_ms"
+    }
+
+    def __init__(self):
+        self.marks = {}
+
+    def on(self, name, info):
+        now = time.perf_counter_ns()
+        step, _, phase = name.rpartition(".")
+        step = step.partition(".")[2]   # drop "connection." / "http11." ...
+
+        if phase == "started":
+            self.marks[step] = now
+            return
+
+        if phase != "complete":
+            return
+
+        timing = self.PHASES.get(step)
+        if timing is not None:
+            started = self.marks.get(step)
+            if started is not None:
+                add_timing(timing, now - started)
+
+        elif step == "receive_response_headers":
+            sent = self.marks.get("send_request_headers")
+            if sent is not None:
+                add_timing("ttfb_ms", now - sent)
+            mark_headers()
+
+
+def _with_trace(request, trace):
+    # httpx.Request objects are reused on retries, the extensions are not
+    # changed in place
+    request.extensions = {**request.extensions, "trace": trace}
+
+
+class _CountingStream(httpx.SyncByteStream):
+
+    def __init__(self, stream, size):
+        self._stream = stream
+        self._size = size
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._size.count(chunk)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class _AsyncCountingStream(httpx.AsyncByteStream):
+
+    def __init__(self, stream, size):
+        self._stream = stream
+        self._size = size
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._size.count(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+
+def _error_size(response, streamed, counting_stream):
+    length = content_length(response.headers)
+    if length is not None:
+        return length
+
+    # stream=False: send() has read the body already
+    if not streamed:
+        return response.num_bytes_downloaded
+
+    # otherwise count the body as the caller reads it
+    size = StreamedSize()
+    response.stream = counting_stream(response.stream, size)
+    return size
+
+
+def _record(request, response, start, timings, streamed, counting_stream):
+    try:
+        status_code = response.status_code
+        record_http(
+            request.method,
+            request.url,
+            status_code,
+            start,
+            _error_size(response, streamed, counting_stream) if status_code >= 400 else None,
+            timings,
+            body_read=not streamed
+        )
+    except Exception:
+        pass  # never crash app
+
+
+def _internal(request):
+    url = request.url
+    return is_internal_host(url.scheme, url.host, url.port)
+
+
+def install_httpx():
+    global _original_send, _original_send_async
+    global _original_handle, _original_handle_async
+
+    if _original_send is not None:
+        return  # Already patched
+
+    _original_send = httpx.Client.send
+    _original_send_async = httpx.AsyncClient.send
+    _original_handle = httpx.HTTPTransport.handle_request
+    _original_handle_async = httpx.AsyncHTTPTransport.handle_async_request
+
+    # Client level: one event per logical call, whatever redirects and
+    # auth round trips it takes. The AsyncSender's own client is skipped
+    # as internal.
+
+    def send(self, request, **kwargs):
+
+        if _internal(request):
+            return _original_send(self, request, **kwargs)
+
+        timings, token = begin_http_call()
+        if token is None:
+            return _original_send(self, request, **kwargs)
+
+        start = time.perf_counter_ns()
+
+        try:
+            response = _original_send(self, request, **kwargs)
+        except Exception as e:
+            record_http_exception(request.method, request.url, e, start, timings)
+            raise
+        finally:
+            end_http_call(token)
+
+        _record(request, response, start, timings, kwargs.get("stream", False), _CountingStream)
+        return response
+
+    async def send_async(self, request, **kwargs):
+
+        if _internal(request):
+            return await _original_send_async(self, request, **kwargs)
+
+        timings, token = begin_http_call()
+        if token is None:
+            return await _original_send_async(self, request, **kwargs)
+
+        start = time.perf_counter_ns()
+
+        try:
+            response = await _original_send_async(self, request, **kwargs)
+        except Exception as e:
+            record_http_exception(request.method, request.url, e, start, timings)
+            raise
+        finally:
+            end_http_call(token)
+
+        _record(request, response, start, timings, kwargs.get("stream", False), _AsyncCountingStream)
+        return response
+
+    # Transport level: phase timings only, for each hop of a call the
+    # client wrappers above are recording
+
+    def handle_request(self, request):
+
+        if current_timings() is None:
+            return _original_handle(self, request)
+
+        phases = _Trace()
+        user_trace = request.extensions.get("trace")
+
+        def trace(name, info):
+            phases.on(name, info)
+            if user_trace is not None:
+                user_trace(name, info)
+
+        _with_trace(request, trace)
+        return _original_handle(self, request)
+
+    async def handle_async_request(self, request):
+
+        if current_timings() is None:
+            return await _original_handle_async(self, request)
+
+        phases = _Trace()
+        user_trace = request.extensions.get("trace")
+
+        async def trace(name, info):
+            phases.on(name, info)
+            if user_trace is not None:
+                await user_trace(name, info)
+
+        _with_trace(request, trace)
+        return await _original_handle_async(self, request)
+
+    httpx.Client.send = send
+    httpx.AsyncClient.send = send_async
+    httpx.HTTPTransport.handle_request = handle_request
+    httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
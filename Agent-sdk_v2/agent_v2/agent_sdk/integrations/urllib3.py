@@ -0,0 +1,157 @@
+import time
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.poolmanager import PoolManager
+from urllib3.util import parse_url
+from ..network import (
+    add_timing,
+    begin_http_call,
+    content_length,
+    current_timings,
+    end_http_call,
+    is_internal_host,
+    mark_headers,
+    record_http,
+    record_http_exception
+)
+
+
+_original_urlopen = None
+
+
+def _timed(original, timing):
+    # connection-level step, added to the enclosing call's phases
+
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            add_timing(timing, time.perf_counter_ns() - start)
+
+    return wrapper
+
+
+def _timed_tls(original):
+    # HTTPSConnection.connect = _new_conn (timed as connect_ms) + handshake
+
+    def connect(self, *args, **kwargs):
+        timings = current_timings()
+        if timings is None:
+            return original(self, *args, **kwargs)
+
+        tcp_before = timings.get("connect_ms", 0.0)
+        start = time.perf_counter_ns()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            tcp_ns = (timings.get("connect_ms", 0.0) - tcp_before) * 1e6
+            add_timing("tls_ms", max(0, time.perf_counter_ns() - start - tcp_ns))
+
+    return connect
+
+
+def _getresponse(original):
+    # request sent -> status line and headers read
+
+    def getresponse(self, *args, **kwargs):
+        start = time.perf_counter_ns()
+        response = original(self, *args, **kwargs)
+        add_timing("ttfb_ms", time.perf_counter_ns() - start)
+        mark_headers()
+        return response
+
+    return getresponse
+
+
+def _response_size(response):
+    length = content_length(response.headers)
+    if length is not None:
+        return length
+
+    # preload_content=True read the body already, a streamed one is
+    # left alone
+    body = getattr(response, "_body", None)
+    return len(body) if isinstance(body, bytes) else None
+
+
+def _body_read(response):
+    return isinstance(getattr(response, "_body", None), bytes)
+
+
+def _instrument(original, target):
+    # target(self, url) -> (scheme, host, port, absolute url)
+
+    def urlopen(self, method, url, *args, **kwargs):
+
+        scheme, host, port, full_url = target(self, url)
+
+        if is_internal_host(scheme, host, port):
+            return original(self, method, url, *args, **kwargs)
+
+        # retries and redirects re-enter urlopen, requests calls it from
+        # its own instrumented call: only the outermost records
+        timings, token = begin_http_call()
+        if token is None:
+            return original(self, method, url, *args, **kwargs)
+
+        start = time.perf_counter_ns()
+
+        try:
+            response = original(self, method, url, *args, **kwargs)
+        except Exception as e:
+            record_http_exception(method, full_url, e, start, timings)
+            raise
+        finally:
+            end_http_call(token)
+
+        try:
+            record_http(
+                method,
+                full_url,
+                response.status,
+                start,
+                _response_size(response) if response.status >= 400 else None,
+                timings,
+                body_read=_body_read(response)
+            )
+        except Exception:
+            pass  # never crash app
+
+        return response
+
+    return urlopen
+
+
+def _pool_target(pool, url):
+    if url.startswith(("http://", "https://")):
+        parsed = parse_url(url)
+        return parsed.scheme, parsed.host, parsed.port, url
+    port = f":{pool.port}" if pool.port else ""
+    return pool.scheme, pool.host, pool.port, f"{pool.scheme}://{pool.host}{port}{url}"
+
+
+def _manager_target(manager, url):
+    parsed = parse_url(url)
+    return parsed.scheme, parsed.host, parsed.port, url
+
+
+def install_urllib3():
+    global _original_urlopen
+
+    if _original_urlopen is not None:
+        return  # Already patched
+
+    _original_urlopen = HTTPConnectionPool.urlopen
+
+    # PoolManager follows redirects across pools itself, so it is the
+    # outermost layer for code that uses it (urllib3.request() too)
+    HTTPConnectionPool.urlopen = _instrument(_original_urlopen, _pool_target)
+    PoolManager.urlopen = _instrument(PoolManager.urlopen, _manager_target)
+
+    # DNS happens inside _new_conn here, there is no separate dns_ms
+    HTTPConnection._new_conn = _timed(HTTPConnection._new_conn, "connect_ms")
+    if "connect" in HTTPSConnection.__dict__:
+        HTTPSConnection.connect = _timed_tls(HTTPSConnection.connect)
+
+    HTTPConnection.getresponse = _getresponse(HTTPConnection.getresponse)
@@ -1,7 +1,15 @@
+import copy
+import hashlib
 import logging
+import os
+import queue
 import traceback
 import re
-from .event_builder import build_event
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from .config import AgentConfig
+from .event_builder import build_event, format_timestamp
 from .queue import EventQueue
 
 
@@ -13,57 +21,440 @@ LOG_LEVEL_SEVERITY = {
     logging.CRITICAL: "CRITICAL",
 }
 
+MAX_MESSAGE_CHARS = 500
+MAX_STACKTRACE_CHARS = 1000
+
+# a rendered frame is at least ~50 chars, so this many fill the stacktrace
+MAX_TRACEBACK_FRAMES = 20
+
+MAX_LOG_ARGS = 10
+MAX_ARG_CHARS = 100
+
+_IPV4 = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")
+_NUMBERS = re.compile(r"\d+")
+_SCALARS = (str, int, float, bool, type(None))
+
 
 # ✅ IP sanitizer
 def sanitize_message(msg: str):
-    # mask IPv4
-    msg = re.sub(r"\b\d{1,3}(?:\.\d{1,3}){3}\b", "x.x.x.x", msg)
-    return msg[:500]  # truncate long logs
+    # cut before masking so huge messages cost a bounded scan; the slack
+    # keeps an address straddling the limit from leaking half unmasked
+    msg = _IPV4.sub("x.x.x.x", msg[:MAX_MESSAGE_CHARS + 15])
+    return msg[:MAX_MESSAGE_CHARS]  # truncate long logs
+
+
+def _capture_arg(value):
+    if isinstance(value, str):
+        return value[:MAX_ARG_CHARS]
+    if isinstance(value, _SCALARS):
+        return value
+    return str(value)[:MAX_ARG_CHARS]
+
+
+def capture_args(args):
+    # taken on the logging thread: args may be mutated once the call returns
+    if not args:
+        return None
+    if isinstance(args, dict):  # logging's "%(name)s" form
+        return {
+            str(key): _capture_arg(value)
+            for key, value in list(args.items())[:MAX_LOG_ARGS]
+        }
+    return [_capture_arg(value) for value in args[:MAX_LOG_ARGS]]
+
+
+def _sanitize_args(args):
+    if isinstance(args, dict):
+        return {
+            key: sanitize_message(value) if isinstance(value, str) else value
+            for key, value in args.items()
+        }
+    return [sanitize_message(value) if isinstance(value, str) else value for value in args]
+
+
+_fingerprints = {}
+
+
+def fingerprint(logger_name, template):
+    # Stable across processes and releases (not hash()). Digits are
+    # masked so f-string messages, which have no separate args, still
+    # group per call site.
+    key = (logger_name, template)
+    value = _fingerprints.get(key)
+    if value is None:
+        if len(_fingerprints) >= 4096:
+            _fingerprints.clear()
+        normalized = _NUMBERS.sub("0", template[:MAX_MESSAGE_CHARS])
+        value = _fingerprints[key] = hashlib.sha1(
+            f"{logger_name}\0{normalized}".encode()
+        ).hexdigest()[:16]
+    return value
+
+
+_CAUSE = "\nThe above exception was the direct cause of the following exception:\n\n"
+_CONTEXT = "\nDuring handling of the above exception, another exception occurred:\n\n"
+
+
+def extract_traceback(exc_info):
+    # Walks the __cause__ / __context__ chain as format_exception does,
+    # but only MAX_TRACEBACK_FRAMES frames in total, without reading
+    # source lines. The summaries hold no frame references, so they can
+    # wait in the queue. -> [(link to the next entry, frames, exception
+    # lines)], the raised exception first.
+    exc_type, exc_value, tb = exc_info
+    chain = []
+    budget = MAX_TRACEBACK_FRAMES
+    seen = set()
+    link = None
+
+    while (
+        exc_value is not None
+        and id(exc_value) not in seen
+        and len(chain) < MAX_TRACEBACK_FRAMES
+    ):
+        seen.add(id(exc_value))
+        frames = traceback.StackSummary.extract(
+            traceback.walk_tb(tb), limit=budget, lookup_lines=False
+        )
+        budget -= len(frames)
+        chain.append((link, frames, traceback.format_exception_only(exc_type, exc_value)))
+
+        if exc_value.__cause__ is not None:
+            link, exc_value = _CAUSE, exc_value.__cause__
+        elif exc_value.__context__ is not None and not exc_value.__suppress_context__:
+            link, exc_value = _CONTEXT, exc_value.__context__
+        else:
+            break
+        exc_type, tb = type(exc_value), exc_value.__traceback__
+
+    return chain
+
+
+def render_traceback(extracted):
+    # oldest exception first, like format_exception
+    parts = []
+    for link, frames, exception_only in reversed(extracted):
+        if frames:
+            parts.append("Traceback (most recent call last):\n")
+            parts.extend(frames.format())
+        parts.extend(exception_only)
+        if link:
+            parts.append(link)
+    return "".join(parts)[:MAX_STACKTRACE_CHARS]
+
+
+class LogData:
+
+    # The "data" of a LOG event with sanitizing and traceback rendering
+    # left to the serializer, which calls to_dict() in the sender thread.
+
+    __slots__ = (
+        "logger_name", "level", "levelno", "message", "template", "args", "file",
+        "line", "traceback", "repeat_count", "first_seen", "last_seen"
+    )
+
+    def __init__(self, record, message, template, args, extracted):
+        self.logger_name = record.name
+        self.level = record.levelname
+        self.levelno = record.levelno   # getLevelName() is a str for custom levels
+        self.message = message
+        self.template = template
+        self.args = args
+        self.file = record.pathname
+        self.line = record.lineno
+        self.traceback = extracted
+        self.repeat_count = None
+
+    def repeated(self, count, first_ns, last_ns):
+        # same log line, standing for `count` suppressed occurrences
+        data = copy.copy(self)
+        data.repeat_count = count
+        data.first_seen = first_ns
+        data.last_seen = last_ns
+        return data
+
+    def to_dict(self):
+        data = {
+            "logger_name": self.logger_name,
+            "level": self.level,
+            "message": sanitize_message(self.message),
+            "template": sanitize_message(self.template),
+            "fingerprint": fingerprint(self.logger_name, self.template),
+            "file": self.file,
+            "line": self.line,
+            "stacktrace": render_traceback(self.traceback) if self.traceback else None
+        }
+
+        if self.args:
+            data["args"] = _sanitize_args(self.args)
+
+        if self.repeat_count:
+            data["repeat_count"] = self.repeat_count
+            data["first_seen"] = format_timestamp(self.first_seen)
+            data["last_seen"] = format_timestamp(self.last_seen)
+
+        return data
+
+
+class LogDedup:
+
+    # One token bucket per (logger, level, message template, file, line):
+    # log_burst events pass at once, then log_rate per second. Records
+    # beyond that are only counted, and sweep() (on the sender thread,
+    # every log_dedup_window seconds) ships one LOG event per key with
+    # repeat_count and the first / last suppressed timestamps.
+
+    _lock = threading.Lock()
+    _entries = {}   # key -> [tokens, refilled_at, repeats, first_ns, last_ns, data]
+
+    # handed out when the table is full: the record passes untracked
+    UNTRACKED = [0.0, 0.0, 0, 0, 0, None]
+
+    @staticmethod
+    def _key(record):
+        # queue mode formats msg on the logging thread, the template is kept
+        template = getattr(record, "agent_template", record.msg)
+        if not isinstance(template, str):
+            template = ""
+        return (record.name, record.levelno, template, record.pathname, record.lineno)
+
+    @classmethod
+    def admit(cls, record):
+
+        key = cls._key(record)
+        now = time.monotonic()
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+
+            if entry is None:
+                if len(cls._entries) >= AgentConfig.log_dedup_max_keys:
+                    return cls.UNTRACKED
+                entry = cls._entries[key] = [
+                    float(AgentConfig.log_burst), now, 0, 0, 0, None
+                ]
+
+            tokens = min(
+                AgentConfig.log_burst,
+                entry[0] + (now - entry[1]) * AgentConfig.log_rate
+            )
+            entry[1] = now
+
+            if tokens >= 1.0:
+                entry[0] = tokens - 1.0
+                return entry
+
+            entry[0] = tokens
+            now_ns = time.time_ns()
+            if not entry[2]:
+                entry[3] = now_ns
+            entry[2] += 1
+            entry[4] = now_ns
+            return None
+
+    @classmethod
+    def sweep(cls):
+
+        repeated = []
+        idle_since = time.monotonic() - AgentConfig.log_dedup_window
+
+        with cls._lock:
+            for key, entry in list(cls._entries.items()):
+                if entry[2]:
+                    if entry[5] is not None:
+                        repeated.append(entry[5].repeated(entry[2], entry[3], entry[4]))
+                    entry[2] = 0
+                elif entry[1] < idle_since:
+                    del cls._entries[key]
+
+        for data in repeated:
+            EventQueue.push(build_event(
+                event_type="LOG",
+                category="APPLICATION",
+                status="FAILURE" if data.levelno >= logging.ERROR else "SUCCESS",
+                metrics={},
+                severity=LOG_LEVEL_SEVERITY.get(data.levelno, "LOW"),
+                data=data
+            ))
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        cls._lock = threading.Lock()
+        cls._entries = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=LogDedup._after_fork_in_child)
 
 
 class AgentLogHandler(logging.Handler):
 
     def emit(self, record):
 
+        # Logger.callHandlers checks this too, QueueListener and direct
+        # callers do not
+        if record.levelno < self.level:
+            return
+
         try:
+            entry = None
+            if AgentConfig.log_dedup:
+                # before any formatting: repeats only bump a counter
+                entry = LogDedup.admit(record)
+                if entry is None:
+                    return
+
+            # formatted now: args may be mutated once the call returns
+            message = record.getMessage()
+
             # ⭐ optional: ignore noisy werkzeug access logs
-            if record.name == "werkzeug" and "GET /" in record.getMessage():
+            if record.name == "werkzeug" and "GET /" in message:
                 return
 
-            severity = LOG_LEVEL_SEVERITY.get(record.levelno, "LOW")
-
-            stacktrace = None
             if record.exc_info:
-                stacktrace = "".join(
-                    traceback.format_exception(*record.exc_info)
-                )[:1000]
+                extracted = extract_traceback(record.exc_info)
+            else:
+                # taken by AgentQueueHandler on the logging thread
+                extracted = getattr(record, "agent_traceback", None)
+
+            template = getattr(record, "agent_template", None)
+            if template is None:
+                template, args = record.msg, capture_args(record.args)
+            else:
+                args = record.agent_args
+            if not isinstance(template, str):
+                template = str(template)
 
-            message = sanitize_message(record.getMessage())
+            data = LogData(record, message, template, args, extracted)
+            if entry is not None and entry is not LogDedup.UNTRACKED:
+                entry[5] = data  # what the window's repeat summary reports
 
             event = build_event(
                 event_type="LOG",
                 category="APPLICATION",
                 status="FAILURE" if record.levelno >= logging.ERROR else "SUCCESS",
                 metrics={},
-                data={
-                    "logger_name": record.name,
-                    "level": record.levelname,
-                    "message": message,
-                    "file": record.pathname,
-                    "line": record.lineno,
-                    "stacktrace": stacktrace
-                }
+                severity=LOG_LEVEL_SEVERITY.get(record.levelno, "LOW"),
+                data=data if AgentConfig.log_deferred else data.to_dict()
             )
 
-            event["event"]["severity"] = severity
-
             EventQueue.push(event)
 
         except Exception:
             pass
 
 
-def install_logging(level=logging.WARNING):
-    handler = AgentLogHandler()
-    logging.getLogger().addHandler(handler)
-    logging.getLogger().setLevel(level)
\ No newline at end of file
+class AgentQueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # The stdlib version formats the traceback on the logging thread
+        # and clears exc_info on the record every other handler still
+        # sees. Here a copy carries the formatted message and the bounded
+        # traceback summary, and the listener does the rest.
+        record = copy.copy(record)
+        record.agent_template = record.msg
+        record.agent_args = capture_args(record.args)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.agent_traceback = extract_traceback(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LogCapture._dropped += 1
+
+    def handleError(self, record):
+        pass  # never crash app
+
+
+class LogCapture:
+
+    # mode "sync": AgentLogHandler runs in the logging thread
+    # mode "queue": AgentQueueHandler only enqueues the record, a
+    # QueueListener thread builds and pushes the event
+
+    _mode = None
+    _handler = None
+    _listener = None
+    _dropped = 0
+
+    @classmethod
+    def install(cls, level=logging.WARNING, mode="sync"):
+
+        if cls._handler is not None:
+            return
+
+        root = logging.getLogger()
+
+        if mode == "queue":
+            cls._handler = AgentQueueHandler(queue.Queue(AgentConfig.log_queue_size))
+            cls._handler.setLevel(level)
+            cls._start_listener(level)
+            # the application's root level is left alone in this mode
+            root.addHandler(cls._handler)
+        else:
+            cls._handler = AgentLogHandler(level)
+            root.addHandler(cls._handler)
+            root.setLevel(level)
+
+        cls._mode = mode
+
+    @classmethod
+    def _start_listener(cls, level):
+        cls._listener = QueueListener(
+            cls._handler.queue, AgentLogHandler(level), respect_handler_level=True
+        )
+        cls._listener.start()
+
+    @classmethod
+    def stop(cls, timeout=1.0):
+
+        # hand queued records to EventQueue before the sender drains it
+        listener = cls._listener
+        if listener is None or listener._thread is None:
+            return
+
+        thread = listener._thread
+        try:
+            listener.enqueue_sentinel()
+        except queue.Full:
+            return  # daemon thread, the records left die with the process
+        thread.join(timeout)
+        listener._thread = None
+
+    @classmethod
+    def stats(cls):
+        handler = cls._handler
+        return {
+            "mode": cls._mode,
+            "pending": handler.queue.qsize() if isinstance(handler, QueueHandler) else 0,
+            "dropped": cls._dropped
+        }
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # the listener thread did not survive the fork and the queue's
+        # mutex may have been held by it
+        cls._dropped = 0
+        if cls._listener is None:
+            return
+
+        running = cls._listener._thread is not None
+        cls._handler.queue = queue.Queue(AgentConfig.log_queue_size)
+        if running:
+            cls._start_listener(cls._listener.handlers[0].level)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=LogCapture._after_fork_in_child)
+
+
+def install_logging(level=logging.WARNING, mode="sync"):
+    LogCapture.install(level, mode)
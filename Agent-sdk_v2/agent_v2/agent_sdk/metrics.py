@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from .config import AgentConfig
+
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS   # linear buckets per power of two
+LINEAR_LIMIT = SUB_BUCKETS * 2       # values below this get exact buckets
+
+
+def bucket_index(value_us):
+    # log-linear (HDR-style): exact below LINEAR_LIMIT, then SUB_BUCKETS
+    # buckets per power of two, so the relative error stays <= 1/SUB_BUCKETS
+    if value_us < LINEAR_LIMIT:
+        return max(0, value_us)
+    shift = value_us.bit_length() - (SUB_BUCKET_BITS + 1)
+    return (shift + 1) * SUB_BUCKETS + (value_us >> shift) - SUB_BUCKETS
+
+
+def bucket_bounds(index):
+    if index < LINEAR_LIMIT:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LatencyHistogram:
+
+    __slots__ = ("counts", "count", "errors", "total_us", "min_us", "max_us")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.errors = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, duration_ms, error=False):
+        value_us = int(duration_ms * 1000)
+        index = bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value_us
+        if error:
+            self.errors += 1
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = bucket_bounds(index)
+                # bucket midpoint, clamped to what was actually observed
+                value = min(max((low + high) / 2, self.min_us), self.max_us)
+                return round(value / 1000, 3)
+
+        return round(self.max_us / 1000, 3)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "sum_ms": round(self.total_us / 1000, 3),
+            "min_ms": round((self.min_us or 0) / 1000, 3),
+            "max_ms": round(self.max_us / 1000, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            # sparse bucket counts, mergeable server side
+            "buckets": {str(index): n for index, n in self.counts.items()}
+        }
+
+
+OTHER_ROUTE = "{other}"   # outbound routes past outbound_max_routes
+
+
+def status_class(status_code):
+    # None: the call raised before a response came back
+    if status_code is None:
+        return "error"
+    return f"{status_code // 100}xx"
+
+
+class MetricsAggregator:
+
+    _lock = threading.Lock()
+    _requests = {}   # (route, method, status_code) -> LatencyHistogram
+    _queries = {}    # (query_type, table) -> LatencyHistogram
+    _outbound = {}   # (host, route, status_class) -> [LatencyHistogram, {phase: [count, total_us]}]
+    _forwarded = []  # finished summaries from other processes (see Spool)
+    _window_start = time.time()
+
+    @classmethod
+    def _record(cls, table, key, duration_ms, error):
+        with cls._lock:
+            histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = LatencyHistogram()
+            histogram.record(duration_ms, error)
+
+    @classmethod
+    def record_request(cls, route, method, status_code, duration_ms):
+        if not AgentConfig.metrics_enabled:
+            return
+        cls._record(
+            cls._requests,
+            (route, method, status_code),
+            duration_ms,
+            status_code is None or status_code >= 500
+        )
+
+    @classmethod
+    def record_query(cls, query_type, table, duration_ms, error=False):
+        if not AgentConfig.metrics_enabled:
+            return
+        cls._record(cls._queries, (query_type, table), duration_ms, error)
+
+    @classmethod
+    def record_outbound(cls, host, route, status_code, duration_ms, phases=None):
+        if not AgentConfig.metrics_enabled:
+            return
+
+        klass = status_class(status_code)
+        key = (host, route, klass)
+
+        with cls._lock:
+            entry = cls._outbound.get(key)
+            if entry is None:
+                # route templates are guessed from URLs, cap the damage
+                if len(cls._outbound) >= AgentConfig.outbound_max_routes:
+                    key = (host, OTHER_ROUTE, klass)
+                    entry = cls._outbound.get(key)
+                if entry is None:
+                    entry = cls._outbound[key] = [LatencyHistogram(), {}]
+
+            entry[0].record(duration_ms, klass in ("5xx", "error"))
+
+            if phases:
+                totals = entry[1]
+                for phase, phase_ms in phases.items():
+                    total = totals.get(phase)
+                    if total is None:
+                        total = totals[phase] = [0, 0]
+                    total[0] += 1
+                    total[1] += int(phase_ms * 1000)
+
+    @classmethod
+    def add_forwarded(cls, summaries):
+        with cls._lock:
+            cls._forwarded.extend(summaries)
+
+    @classmethod
+    def has_data(cls):
+        return bool(cls._requests or cls._queries or cls._outbound or cls._forwarded)
+
+    @classmethod
+    def snapshot(cls):
+
+        with cls._lock:
+            requests, cls._requests = cls._requests, {}
+            queries, cls._queries = cls._queries, {}
+            outbound, cls._outbound = cls._outbound, {}
+            forwarded, cls._forwarded = cls._forwarded, []
+            window_start, cls._window_start = cls._window_start, time.time()
+
+        window = {
+            "window_start": window_start,
+            "window_end": cls._window_start
+        }
+
+        summaries = forwarded
+
+        for (route, method, status_code), histogram in requests.items():
+            summaries.append({
+                "kind": "http_server",
+                "route": route,
+                "method": method,
+                "status_code": status_code,
+                **window,
+                **histogram.to_dict()
+            })
+
+        for (query_type, table), histogram in queries.items():
+            summaries.append({
+                "kind": "db_query",
+                "query_type": query_type,
+                "table": table,
+                **window,
+                **histogram.to_dict()
+            })
+
+        for (host, route, klass), (histogram, phases) in outbound.items():
+            summaries.append({
+                "kind": "http_client",
+                "host": host,
+                "route": route,
+                "status_class": klass,
+                **window,
+                **histogram.to_dict(),
+                # mean time per phase, over the calls that reported it
+                "phases": {
+                    phase: {
+                        "count": count,
+                        "sum_ms": round(total_us / 1000, 3),
+                        "avg_ms": round(total_us / count / 1000, 3)
+                    }
+                    for phase, (count, total_us) in phases.items()
+                }
+            })
+
+        return summaries
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # the parent ships what it recorded, the child starts a fresh window
+        cls._lock = threading.Lock()
+        cls._requests = {}
+        cls._queries = {}
+        cls._outbound = {}
+        cls._forwarded = []
+        cls._window_start = time.time()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=MetricsAggregator._after_fork_in_child)
@@ -1,9 +1,13 @@
+import contextvars
+import importlib
+import re
 import time
 import requests
 from urllib.parse import urlparse
 from .event_builder import build_event
 from .queue import EventQueue
 from .config import AgentConfig
+from .metrics import MetricsAggregator
 
 
 _original_request = None
@@ -18,6 +22,267 @@ def sanitize_url(url: str) -> str:
         return url
 
 
+# ids, uuids, hashes and tokens in a path segment
+_ID_SEGMENT = re.compile(
+    r"^(?:\d+|[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}"
+    r"|[0-9a-fA-F]{16,}|[A-Za-z0-9_\-]{32,})$"
+)
+
+
+def route_template(path):
+    # /users/42/orders/9f1c0e... -> /users/{id}/orders/{id}
+    if not path:
+        return "/"
+    return "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in path.split("/")
+    )
+
+
+# ----------------------------
+# Collector detection
+# ----------------------------
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_endpoint_address = (None, None)   # (AgentConfig.endpoint, (host, port))
+
+
+def is_internal_host(scheme, host, port):
+    # 🔥 the SDK's own calls to the collector are never recorded
+    global _endpoint_address
+
+    endpoint = AgentConfig.endpoint
+    if not endpoint:
+        return False
+
+    if _endpoint_address[0] != endpoint:
+        try:
+            parsed = urlparse(endpoint)
+            address = (
+                (parsed.hostname or "").lower(),
+                parsed.port or DEFAULT_PORTS.get(parsed.scheme)
+            )
+        except Exception:
+            address = None
+        _endpoint_address = (endpoint, address)
+
+    return (
+        (host or "").lower(),
+        port or DEFAULT_PORTS.get(scheme)
+    ) == _endpoint_address[1]
+
+
+def is_internal(url):
+    try:
+        parsed = urlparse(url)
+        return is_internal_host(parsed.scheme, parsed.hostname, parsed.port)
+    except Exception:
+        return False
+
+
+# ----------------------------
+# Nested clients
+# ----------------------------
+# requests runs on urllib3, and urllib3 retries / redirects re-enter
+# urlopen. The outermost instrumented call owns the event; layers below
+# only add their connection phases to its dict (ms, summed over hops):
+# dns_ms, connect_ms, tls_ms, ttfb_ms (request sent -> response headers)
+# and download_ms (headers -> body read), each where the client exposes it.
+
+_http_call = contextvars.ContextVar("agent_http_call", default=None)
+
+
+def begin_http_call():
+    # -> (timings, token), or (None, None) inside an instrumented call
+    if _http_call.get() is not None:
+        return None, None
+    timings = {}
+    return timings, _http_call.set(timings)
+
+
+def end_http_call(token):
+    _http_call.reset(token)
+
+
+def current_timings():
+    return _http_call.get()
+
+
+def add_timing(name, elapsed_ns):
+    timings = _http_call.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + elapsed_ns / 1e6, 3)
+
+
+def mark_headers():
+    # response headers are in: what follows until the call returns is
+    # the body download
+    timings = _http_call.get()
+    if timings is not None:
+        timings["_headers_at"] = time.perf_counter_ns()
+
+
+# ----------------------------
+# Response size
+# ----------------------------
+def content_length(headers):
+    value = headers.get("Content-Length")
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class StreamedSize:
+
+    # Bytes of a streamed body, counted as the caller consumes it.
+    # Read by the serializer in the sender thread: None when nothing has
+    # been consumed yet, else the count so far.
+
+    __slots__ = ("size", "read")
+
+    def __init__(self):
+        self.size = 0
+        self.read = False
+
+    def count(self, chunk):
+        self.read = True
+        self.size += len(chunk)
+
+    def track(self, response):
+        # requests: iter_content also backs .content, .text and iter_lines
+        iter_content = response.iter_content
+
+        def counting_iter_content(*args, **kwargs):
+            self.read = True
+            for chunk in iter_content(*args, **kwargs):
+                self.size += len(chunk)
+                yield chunk
+
+        response.iter_content = counting_iter_content
+        return self
+
+    def to_dict(self):
+        return self.size if self.read else None
+
+
+def response_size(response):
+    # Never touches response.content: with stream=True that downloads
+    # and buffers a body the caller may not even read.
+    length = content_length(response.headers)
+    if length is not None:
+        return length
+
+    # stream=False: requests has read the body already
+    content = response.__dict__.get("_content", False)
+    if isinstance(content, bytes):
+        return len(content)
+
+    return StreamedSize().track(response)
+
+
+# ----------------------------
+# Events (same schema for every client)
+# ----------------------------
+def _finish(start_ns, timings, body_read):
+    # -> (duration_ms, phases) measured with perf_counter_ns
+    end = time.perf_counter_ns()
+    if not timings:
+        return round((end - start_ns) / 1e6, 3), None
+
+    headers_at = timings.pop("_headers_at", None)
+    if headers_at is not None and body_read:
+        timings["download_ms"] = round((end - headers_at) / 1e6, 3)
+    return round((end - start_ns) / 1e6, 3), timings
+
+
+def _target(url):
+    # -> (sanitized url, host, route template)
+    parsed = urlparse(str(url))
+    host = parsed.netloc.rpartition("@")[2]   # never the credentials
+    return f"{parsed.scheme}://{host}{parsed.path}", host, route_template(parsed.path)
+
+
+def record_http(method, url, status_code, start_ns, size=None, timings=None, body_read=False):
+
+    duration_ms, phases = _finish(start_ns, timings, body_read)
+    safe_url, host, route = _target(url)   # ✅ sanitized
+
+    MetricsAggregator.record_outbound(host, route, status_code, duration_ms, phases)
+
+    metrics = {"duration_ms": duration_ms}
+    if phases:
+        metrics.update(phases)
+
+    # ----------------------------
+    # HTTP 4xx / 5xx Handling
+    # ----------------------------
+    if status_code >= 400:
+
+        event = build_event(
+            event_type="HTTP_ERROR",
+            category="NETWORK",
+            status="FAILURE",
+            metrics=metrics,
+            data={
+                "method": method,
+                "url": safe_url,
+                "status_code": status_code,
+                "response_size": size
+            }
+        )
+
+    # successful calls are in the http_client summaries, one event per
+    # call only on request (or when there are no summaries)
+    elif AgentConfig.http_call_events or not AgentConfig.metrics_enabled:
+
+        event = build_event(
+            event_type="HTTP_CALL",
+            category="NETWORK",
+            status="SUCCESS",
+            metrics=metrics,
+            data={
+                "method": method,
+                "url": safe_url,
+                "status_code": status_code
+            }
+        )
+
+    else:
+        return
+
+    EventQueue.push(event)
+
+
+def record_http_exception(method, url, exc, start_ns, timings=None):
+
+    duration_ms, phases = _finish(start_ns, timings, False)
+    safe_url, host, route = _target(url)   # ✅ sanitized
+
+    MetricsAggregator.record_outbound(host, route, None, duration_ms, phases)
+
+    metrics = {"duration_ms": duration_ms}
+    if phases:
+        metrics.update(phases)
+
+    event = build_event(
+        event_type="HTTP_EXCEPTION",
+        category="NETWORK",
+        status="FAILURE",
+        metrics=metrics,
+        data={
+            "method": method,
+            "url": safe_url,
+            "exception_type": type(exc).__name__,
+            "message": str(exc)
+        }
+    )
+
+    EventQueue.push(event)
+
+
 def install_http_patch():
     global _original_request
 
@@ -28,85 +293,56 @@ def install_http_patch():
 
     def patched_request(self, method, url, **kwargs):
 
-        # 🔥 Ignore SDK internal endpoint
-        if AgentConfig.endpoint:
-            try:
-                if urlparse(url).netloc == urlparse(AgentConfig.endpoint).netloc:
-                    return _original_request(self, method, url, **kwargs)
-            except Exception:
-                pass
+        # outside the try: a failed collector call must not be re-sent
+        # through the instrumented path
+        if is_internal(url):
+            return _original_request(self, method, url, **kwargs)
 
-        # ✅ sanitize URL once
-        safe_url = sanitize_url(url)
+        timings, token = begin_http_call()
+        if token is None:
+            return _original_request(self, method, url, **kwargs)
 
-        start = time.time()
+        start = time.perf_counter_ns()
 
         try:
             response = _original_request(self, method, url, **kwargs)
-            duration_ms = int((time.time() - start) * 1000)
-
-            # ----------------------------
-            # HTTP 4xx / 5xx Handling
-            # ----------------------------
-            if response.status_code >= 400:
-
-                event = build_event(
-                    event_type="HTTP_ERROR",
-                    category="NETWORK",
-                    status="FAILURE",
-                    metrics={
-                        "duration_ms": duration_ms
-                    },
-                    data={
-                        "method": method,
-                        "url": safe_url,   # ✅ sanitized
-                        "status_code": response.status_code,
-                        "response_size": len(response.content)
-                    }
-                )
-
-                EventQueue.push(event)
-
-            else:
-                # Successful call
-                event = build_event(
-                    event_type="HTTP_CALL",
-                    category="NETWORK",
-                    status="SUCCESS",
-                    metrics={
-                        "duration_ms": duration_ms
-                    },
-                    data={
-                        "method": method,
-                        "url": safe_url,   # ✅ sanitized
-                        "status_code": response.status_code
-                    }
-                )
-
-                EventQueue.push(event)
-
-            return response
-
         except Exception as e:
-            duration_ms = int((time.time() - start) * 1000)
-
-            event = build_event(
-                event_type="HTTP_EXCEPTION",
-                category="NETWORK",
-                status="FAILURE",
-                metrics={
-                    "duration_ms": duration_ms
-                },
-                data={
-                    "method": method,
-                    "url": safe_url,   # ✅ sanitized
-                    "exception_type": type(e).__name__,
-                    "message": str(e)
-                }
+            record_http_exception(method, url, e, start, timings)
+            raise
+        finally:
+            end_http_call(token)
+
+        try:
+            record_http(
+                method,
+                url,
+                response.status_code,
+                start,
+                response_size(response) if response.status_code >= 400 else None,
+                timings,
+                # stream=False: the download happened inside the call
+                body_read=isinstance(response.__dict__.get("_content"), bytes)
             )
+        except Exception:
+            pass  # never crash app
 
-            EventQueue.push(event)
+        return response
 
-            raise
+    requests.Session.request = patched_request
+
+
+# optional clients, each instrumented when it is installed
+HTTP_CLIENTS = {
+    "httpx": "install_httpx",
+    "aiohttp": "install_aiohttp",
+    "urllib3": "install_urllib3"
+}
 
-    requests.Session.request = patched_request
\ No newline at end of file
+
+def install_http_clients():
+    for module, installer in HTTP_CLIENTS.items():
+        try:
+            integration = importlib.import_module(f".integrations.{module}", __package__)
+        except ImportError:
+            continue
+        getattr(integration, installer)()
@@ -0,0 +1,52 @@
+import threading
+
+
+# hot-path sections time one call in SAMPLE_EVERY and scale it up
+SAMPLE_EVERY = 16
+
+
+class Overhead:
+
+    # What the SDK costs the application: time in build_event and
+    # EventQueue.push on the application's threads, serialization and
+    # send on the sender's, plus the bytes that went over the wire.
+    # Call sites keep their own itertools.count() so a sampled section
+    # costs one counter step on the calls it does not time.
+
+    _lock = threading.Lock()
+    _sections = {}   # name -> [calls, total_ns, max_ns]
+    _bytes = {"bytes_sent": 0, "bytes_uncompressed": 0}
+
+    @classmethod
+    def record(cls, section, elapsed_ns, weight=1):
+        with cls._lock:
+            entry = cls._sections.get(section)
+            if entry is None:
+                entry = cls._sections[section] = [0, 0, 0]
+            entry[0] += weight
+            entry[1] += elapsed_ns * weight
+            if elapsed_ns > entry[2]:
+                entry[2] = elapsed_ns
+
+    @classmethod
+    def add_bytes(cls, uncompressed, sent):
+        with cls._lock:
+            cls._bytes["bytes_uncompressed"] += uncompressed
+            cls._bytes["bytes_sent"] += sent
+
+    @classmethod
+    def snapshot(cls):
+
+        with cls._lock:
+            sections = {name: list(entry) for name, entry in cls._sections.items()}
+            totals = dict(cls._bytes)
+
+        for name, (calls, total_ns, max_ns) in sections.items():
+            totals[name] = {
+                "calls": calls,
+                "total_ms": round(total_ns / 1e6, 3),
+                "avg_us": round(total_ns / calls / 1e3, 3) if calls else 0.0,
+                "max_us": round(max_ns / 1e3, 3)
+            }
+
+        return totals
@@ -1,19 +1,464 @@
+import itertools
+import os
+import random
+import tempfile
 import threading
+import time
+from collections import deque
+from pathlib import Path
+from .config import AgentConfig
+from .overhead import Overhead, SAMPLE_EVERY
+from . import serializer
+
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "sample", "spill")
+
+
+def default_spill_path():
+    # one file per process so pre-fork workers never interleave writes
+    return Path(tempfile.gettempdir()) / f"agent_sdk_spill_{os.getpid()}.jsonl"
+
+
+class SpillFile:
+
+    # Overflow events as JSON lines. The reader keeps an offset instead
+    # of rewriting the file on every drain; the consumed head is cut off
+    # only once it outweighs what is left, so a byte is copied at most
+    # once on average. max_bytes bounds the unread bytes.
+
+    def __init__(self, path=None, max_bytes=50 * 1024 * 1024):
+        self.path = Path(path) if path else default_spill_path()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def append(self, event):
+
+        try:
+            line = serializer.dumps(event) + b"\n"
+        except Exception:
+            return False
+
+        size = len(line)
+
+        with self._lock:
+            if self.bytes + size > self.max_bytes:
+                return False
+
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(line)
+            except OSError:
+                return False
+
+            self.bytes += size
+
+        return True
+
+    def replay(self, limit):
+        events = []
+        for line in self._read(limit):
+            try:
+                events.append(serializer.loads(line))
+            except ValueError:
+                continue
+        return events
+
+    def _read(self, limit):
+
+        lines = []
+
+        with self._lock:
+            if not self.bytes:
+                return lines
+
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    while len(lines) < limit:
+                        line = f.readline()
+                        if not line:
+                            self.bytes = 0  # file shorter than counted
+                            break
+                        lines.append(line)
+                        self.bytes -= len(line)
+                    self._offset = f.tell()
+
+                    rest = f.read() if 0 < self.bytes < self._offset else None
+
+                if not self.bytes:
+                    os.remove(self.path)
+                    self._offset = 0
+                elif rest is not None:
+                    with open(self.path, "wb") as f:
+                        f.write(rest)
+                    self._offset = 0
+
+            except OSError:
+                self.bytes = 0
+                self._offset = 0
+
+        return lines
+
+
+class RingBuffer:
+
+    # deque.append / popleft are atomic under the GIL, so the hot path
+    # (push below capacity) and the single consumer (drain) take no lock.
+    # The deque has no maxlen: pushes racing past the capacity check
+    # overshoot by at most one event each instead of silently evicting.
+    # Only the overflow path serializes on _stats_lock.
+
+    def __init__(
+        self,
+        capacity,
+        overflow_policy="drop_oldest",
+        sample_rate=0.1,
+        spill_path=None,
+        spill_max_bytes=50 * 1024 * 1024,
+        spill=None
+    ):
+
+        if capacity <= 0:
+            raise ValueError("Queue capacity must be positive")
+
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow_policy}")
+
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self.spill = spill or SpillFile(spill_path, spill_max_bytes)
+
+        self._items = deque()
+        self._stats_lock = threading.Lock()
+
+        self.dropped = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, event):
+        items = self._items
+        if len(items) < self.capacity:
+            items.append(event)
+            return len(items)
+
+        self._overflow(event)
+        return self.capacity
+
+    def _overflow(self, event):
+
+        policy = self.overflow_policy
+
+        if policy == "spill" and self.spill.append(event):
+            with self._stats_lock:
+                self.spilled += 1
+            return
+
+        with self._stats_lock:
+            # sample: keep a random subset of the overflow; each kept
+            # event evicts the oldest one, so exactly one is lost either way
+            if policy == "drop_oldest" or (
+                policy == "sample" and random.random() < self.sample_rate
+            ):
+                self._items.append(event)
+                try:
+                    self._items.popleft()
+                except IndexError:
+                    pass  # drained meanwhile
+
+            self.dropped += 1
+
+    def drain(self, limit=None, replay=True):
+
+        items = self._items
+        count = len(items)
+        if limit is not None:
+            count = min(count, limit)
+
+        batch = []
+        append = batch.append
+        popleft = items.popleft
+
+        try:
+            for _ in range(count):
+                append(popleft())
+        except IndexError:
+            pass
+
+        # replay spilled events once the in-memory buffer has caught up
+        if replay and self.spill.bytes and not items:
+            room = self.capacity if limit is None else limit - len(batch)
+            if room > 0:
+                batch.extend(self.spill.replay(room))
+
+        return batch
+
+    def stats(self):
+        return {
+            "depth": len(self._items),
+            "capacity": self.capacity,
+            "overflow_policy": self.overflow_policy,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "spill_bytes": self.spill.bytes
+        }
+
+
+class ShardedBuffer:
+
+    # One RingBuffer per thread. Asyncio tasks on a loop share their
+    # loop thread's shard, which is already contention free. The lock
+    # only guards shard registration and the drain-time snapshot.
+    # Shards share one spill file and its budget, and split `capacity`
+    # evenly between them unless shard_capacity fixes a per-thread bound
+    # (a shard shrunk by a new thread keeps its events until the drain).
+
+    def __init__(
+        self,
+        capacity,
+        shard_capacity=None,
+        spill_path=None,
+        spill_max_bytes=50 * 1024 * 1024,
+        **policy
+    ):
+        self.capacity = capacity
+        self.shard_capacity = shard_capacity
+        self.policy = policy
+        self.spill = SpillFile(spill_path, spill_max_bytes)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+        # pushes since the last drain, across shards: next() is atomic,
+        # and exactly one push sees each depth
+        self._pushed = itertools.count(1)
+        self._drained_at = 0
+
+        # counters carried over from pruned shards
+        self._retired = {"dropped": 0, "spilled": 0}
+
+    def __len__(self):
+        return sum(len(buffer) for _, buffer in self._shards)
+
+    def _resize(self):
+        # called with _lock held
+        if self.shard_capacity or not self._shards:
+            return
+        per_shard = max(1, self.capacity // len(self._shards))
+        for _, buffer in self._shards:
+            buffer.capacity = per_shard
+
+    def _register(self):
+        with self._lock:
+            buffer = RingBuffer(
+                self.shard_capacity or self.capacity, spill=self.spill, **self.policy
+            )
+            self._shards.append((threading.current_thread(), buffer))
+            self._resize()
+
+        self._local.buffer = buffer
+        return buffer
+
+    def push(self, event):
+        try:
+            buffer = self._local.buffer
+        except AttributeError:
+            buffer = self._register()
+
+        buffer.push(event)
+        return next(self._pushed) - self._drained_at
+
+    def drain(self, limit=None):
+
+        self._drained_at = next(self._pushed)
+
+        with self._lock:
+            shards = list(self._shards)
+
+        batch = []
+        for _, buffer in shards:
+            remaining = None if limit is None else limit - len(batch)
+            if remaining is not None and remaining <= 0:
+                break
+            batch.extend(buffer.drain(remaining, replay=False))
+
+        # replay the shared spill once every shard has caught up
+        if self.spill.bytes and not len(self):
+            room = self.capacity if limit is None else limit - len(batch)
+            if room > 0:
+                batch.extend(self.spill.replay(room))
+
+        self._prune()
+        return batch
+
+    def _prune(self):
+        # forget shards of finished threads once they are fully drained
+        with self._lock:
+            alive = []
+            for thread, buffer in self._shards:
+                if thread.is_alive() or len(buffer):
+                    alive.append((thread, buffer))
+                else:
+                    self._retired["dropped"] += buffer.dropped
+                    self._retired["spilled"] += buffer.spilled
+            if len(alive) != len(self._shards):
+                self._shards = alive
+                self._resize()
+
+    def stats(self):
+        shards = [buffer.stats() for _, buffer in self._shards]
+        return {
+            "depth": sum(s["depth"] for s in shards),
+            "capacity": sum(s["capacity"] for s in shards),
+            "overflow_policy": self.policy.get("overflow_policy", "drop_oldest"),
+            "dropped": self._retired["dropped"] + sum(s["dropped"] for s in shards),
+            "spilled": self._retired["spilled"] + sum(s["spilled"] for s in shards),
+            "spill_bytes": self.spill.bytes,
+            "shards": len(shards)
+        }
 
 
 class EventQueue:
 
-    _queue = []
-    _lock = threading.Lock()
+    _buffer = RingBuffer(AgentConfig.queue_capacity)
+
+    # Sender wake-ups: pushes notify only when the sender is idle or the
+    # buffer depth (across shards in sharded mode) reaches _wake_at, so
+    # the hot path never touches the condition otherwise.
+    _ready = threading.Condition()
+    _idle = False
+    _wake_at = AgentConfig.flush_max_events
+    _stopped = False  # shutdown: waits return at once
+
+    # run once by the next wake-up, see on_next_push
+    _on_wake = None
+
+    @classmethod
+    def _new_buffer(cls):
+        policy = {
+            "overflow_policy": AgentConfig.overflow_policy,
+            "sample_rate": AgentConfig.overflow_sample_rate,
+            "spill_path": AgentConfig.spill_path,
+            "spill_max_bytes": AgentConfig.spill_max_bytes
+        }
+
+        if AgentConfig.queue_sharded:
+            return ShardedBuffer(
+                AgentConfig.queue_capacity, AgentConfig.shard_capacity, **policy
+            )
+        return RingBuffer(AgentConfig.queue_capacity, **policy)
+
+    @classmethod
+    def configure(cls):
+        buffer = cls._new_buffer()
+
+        # keep anything captured before Agent.init ran
+        for event in cls._buffer.drain():
+            buffer.push(event)
+
+        cls._buffer = buffer
+
+    # optional admission hook (sampling), None keeps push branch-cheap
+    _filter = None
+
+    @classmethod
+    def set_filter(cls, admit):
+        cls._filter = admit
+
+    _push_tick = itertools.count()
 
     @classmethod
     def push(cls, event):
-        with cls._lock:
-            cls._queue.append(event)
+
+        if next(cls._push_tick) % SAMPLE_EVERY:
+            admit = cls._filter
+            if admit is not None and not admit(event):
+                return
+            cls.push_raw(event)
+            return
+
+        start = time.perf_counter_ns()
+        admit = cls._filter
+        if admit is None or admit(event):
+            cls.push_raw(event)
+        Overhead.record("queue_push", time.perf_counter_ns() - start, SAMPLE_EVERY)
 
     @classmethod
-    def flush(cls):
-        with cls._lock:
-            batch = cls._queue[:]
-            cls._queue.clear()
-        return batch
+    def push_raw(cls, event):
+        depth = cls._buffer.push(event)
+        if cls._idle or depth == cls._wake_at:
+            cls._wake()
+
+    @classmethod
+    def _wake(cls):
+        with cls._ready:
+            hook, cls._on_wake = cls._on_wake, None
+            cls._idle = False
+            cls._ready.notify_all()
+
+        if hook is not None:
+            hook()
+
+    @classmethod
+    def on_next_push(cls, hook):
+        # the next push wakes as if the sender were idle and runs `hook`
+        # in the pushing thread, so push_raw stays as cheap as before
+        with cls._ready:
+            cls._on_wake = hook
+            cls._idle = True
+
+    @classmethod
+    def stop_waiting(cls):
+        with cls._ready:
+            cls._stopped = True
+            cls._ready.notify_all()
+
+    @classmethod
+    def set_wake_threshold(cls, depth):
+        cls._wake_at = max(1, int(depth))
+
+    @classmethod
+    def wait_for_events(cls, timeout=None):
+        with cls._ready:
+            cls._idle = True
+            try:
+                return cls._ready.wait_for(
+                    lambda: cls._stopped or len(cls._buffer) > 0, timeout
+                )
+            finally:
+                cls._idle = False
+
+    @classmethod
+    def wait_until(cls, predicate, timeout):
+        with cls._ready:
+            return cls._ready.wait_for(lambda: cls._stopped or predicate(), timeout)
+
+    @classmethod
+    def flush(cls, limit=None):
+        return cls._buffer.drain(limit)
+
+    @classmethod
+    def size(cls):
+        return len(cls._buffer)
+
+    @classmethod
+    def stats(cls):
+        return cls._buffer.stats()
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # queued events belong to the parent, which still sends them; the
+        # condition may have been held by the parent's sender at fork time
+        cls._buffer = cls._new_buffer()
+        cls._ready = threading.Condition()
+        cls._idle = False
+        cls._stopped = False
+        cls._on_wake = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=EventQueue._after_fork_in_child)
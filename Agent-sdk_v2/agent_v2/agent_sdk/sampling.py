@@ -0,0 +1,124 @@
+import contextvars
+import os
+import random
+import threading
+from .config import AgentConfig
+from .queue import EventQueue
+from .severity import get_severity
+
+
+ALWAYS_KEEP_SEVERITIES = {"HIGH", "CRITICAL"}
+
+
+class RequestContext:
+
+    __slots__ = ("held", "errored")
+
+    def __init__(self):
+        self.held = []
+        self.errored = False
+
+
+_request_context = contextvars.ContextVar("agent_request_context", default=None)
+
+
+class Sampler:
+
+    # Head sampling: each event type keeps AgentConfig.sample_rates[type]
+    # of its events (default 1.0), FAILURE / HIGH+ events are always kept.
+    # Tail sampling: head-dropped events of a request are held until the
+    # request ends and shipped after all if anything in it failed.
+
+    _dropped = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def admit(cls, event):
+
+        ctx = _request_context.get()
+
+        if event.status == "FAILURE" or (
+            event.severity or get_severity(event.event_type)
+        ) in ALWAYS_KEEP_SEVERITIES:
+            if ctx is not None and not ctx.errored:
+                ctx.errored = True
+                cls._release(ctx)
+            return True
+
+        rate = AgentConfig.sample_rates.get(event.event_type, 1.0)
+        if rate >= 1.0:
+            return True
+
+        if ctx is not None and ctx.errored:
+            return True
+
+        if random.random() < rate:
+            event.sample_rate = rate
+            return True
+
+        if (
+            ctx is not None
+            and AgentConfig.tail_sampling
+            and len(ctx.held) < AgentConfig.max_held_per_request
+        ):
+            ctx.held.append(event)
+            return False
+
+        cls._count_dropped(event.event_type)
+        return False
+
+    @classmethod
+    def _release(cls, ctx):
+        held, ctx.held = ctx.held, []
+        for event in held:
+            EventQueue.push_raw(event)
+
+    @classmethod
+    def _count_dropped(cls, event_type, count=1):
+        with cls._lock:
+            cls._dropped[event_type] = cls._dropped.get(event_type, 0) + count
+
+    @classmethod
+    def add_dropped(cls, counts):
+        # counts forwarded by other processes (see Spool)
+        for event_type, count in counts.items():
+            cls._count_dropped(event_type, count)
+
+    @classmethod
+    def begin_request(cls):
+        return _request_context.set(RequestContext())
+
+    @classmethod
+    def end_request(cls, token):
+
+        ctx = _request_context.get()
+
+        try:
+            _request_context.reset(token)
+        except ValueError:
+            _request_context.set(None)  # token from another context
+
+        if ctx is None:
+            return
+
+        # the request finished cleanly: held events are sampled out for good
+        for event in ctx.held:
+            cls._count_dropped(event.event_type)
+        ctx.held = []
+
+    @classmethod
+    def drain_dropped(cls):
+        # per-type sampled-out counts since the last batch, for reweighting
+        with cls._lock:
+            dropped, cls._dropped = cls._dropped, {}
+        return dropped
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        # counts belong to the parent, which still ships them
+        cls._dropped = {}
+        cls._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Sampler._after_fork_in_child)
@@ -1,13 +1,12 @@
 import hmac
 import hashlib
-import json
 
 
-def generate_signature(secret: str, timestamp: str, payload: dict) -> str:
-    message = timestamp + json.dumps(payload, sort_keys=True)
+def generate_signature(secret: str, timestamp: str, body: bytes) -> str:
+    # sign the exact bytes that go on the wire (before compression)
     signature = hmac.new(
         secret.encode(),
-        message.encode(),
+        timestamp.encode() + body,
         hashlib.sha256
     ).hexdigest()
     return signature
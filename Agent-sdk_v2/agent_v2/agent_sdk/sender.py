@@ -1,11 +1,25 @@
+import heapq
+import itertools
+import os
 import threading
 import time
 import requests
+from collections import deque
+from pathlib import Path
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone
 from .queue import EventQueue
 from .config import AgentConfig
 from .security import generate_signature
-import json
+from .compression import choose_encoding, compress
+from .identity import Identity
+from .spill import SpillStore, default_spill_dir, spill_namespace
+from .sampling import Sampler
+from .metrics import MetricsAggregator
+from .spool import Spool
+from .daemon import DaemonClient
+from .overhead import Overhead
+from . import serializer
 
 
 def current_utc():
@@ -17,75 +31,609 @@ class Sender:
     RETRY_LIMIT = 5
     BASE_BACKOFF = 1  # seconds
 
+    # running estimate used to turn flush_max_bytes into a queue depth
+    _avg_event_bytes = 1024.0
+
+    _encoding = None
+    _encoding_negotiated = False
+
+    _session = None
+    _adapter = None
+    _session_lock = threading.Lock()
+
+    # failed bodies waiting for their backoff: (due, seq, attempt, body)
+    _retries = []
+    _retry_seq = itertools.count()
+    _spill = None
+    _healthy = True
+
+    # spill segment being replayed: [claimed, bodies left, replayed]
+    _replay = None
+
+    # [interval, next_due, task] entries, see add_periodic
+    _periodic = []
+    _thread = None
+    _stopping = threading.Event()
+
+    # encoded bodies not yet posted, and the one being posted right now
+    _outbox = deque()
+    _posting = None
+
+    _stats = {
+        "batches_sent": 0,
+        "send_failures": 0,
+        "retries_scheduled": 0,
+        "batches_spilled": 0,
+        "batches_replayed": 0
+    }
+
     @staticmethod
     def start():
-        thread = threading.Thread(target=Sender._run, daemon=True)
-        thread.start()
+        Sender._update_wake_threshold()
+
+        if AgentConfig.metrics_enabled:
+            Sender.add_periodic(AgentConfig.metrics_interval, Sender._ship_summaries)
+
+        Sender._start_thread()
+
+    @staticmethod
+    def _start_thread():
+        Sender._thread = threading.Thread(target=Sender._run, daemon=True)
+        Sender._thread.start()
+
+    @staticmethod
+    def add_periodic(interval, task):
+        # background work run on the sender thread every `interval` seconds
+        Sender._periodic.append([interval, time.monotonic() + interval, task])
+
+    @staticmethod
+    def _until_next_wakeup():
+        due = [entry[1] for entry in Sender._periodic]
+        if Sender._retries:
+            due.append(Sender._retries[0][0])
+        if not due:
+            return None
+        return max(0, min(due) - time.monotonic())
+
+    @staticmethod
+    def _run_periodic():
+        now = time.monotonic()
+        for entry in Sender._periodic:
+            if entry[1] <= now:
+                entry[1] = now + entry[0]
+                try:
+                    entry[2]()
+                except Exception:
+                    pass
 
     @staticmethod
     def _run():
-        while True:
-            time.sleep(5)
 
-            batch = EventQueue.flush()
-            if not batch:
+        deadline = None
+
+        while not Sender._stopping.is_set():
+            try:
+                if not EventQueue.size():
+                    # idle: sleep until the first event arrives or timed work is due
+                    EventQueue.wait_for_events(timeout=Sender._until_next_wakeup())
+
+                if Sender._stopping.is_set():
+                    break  # shutdown() drains the rest in parallel
+
+                if EventQueue.size():
+                    now = time.monotonic()
+                    if deadline is None:
+                        deadline = now + AgentConfig.flush_interval
+
+                    # flush on size / byte threshold or latency deadline,
+                    # waking early only to run due retries / periodic tasks
+                    timeout = deadline - now
+                    wakeup_in = Sender._until_next_wakeup()
+                    if wakeup_in is not None:
+                        timeout = min(timeout, wakeup_in)
+
+                    ready = EventQueue.wait_until(Sender._batch_ready, max(0, timeout))
+                    if Sender._stopping.is_set():
+                        break
+
+                    if ready or time.monotonic() >= deadline:
+                        deadline = None
+                        Sender._flush()
+
+                Sender._process_retries()
+                Sender._run_periodic()
+
+            except Exception:
+                time.sleep(1)  # never spin on unexpected errors
+
+    @staticmethod
+    def _get_session():
+
+        if Sender._session is not None:
+            return Sender._session
+
+        with Sender._session_lock:
+            if Sender._session is None:
+                # dedicated keep-alive pool, retries are handled by the sender
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=AgentConfig.http_pool_size,
+                    max_retries=0
+                )
+
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                Sender._adapter = adapter
+                Sender._session = session
+
+        return Sender._session
+
+    @staticmethod
+    def connection_stats():
+
+        stats = {
+            "requests": 0,
+            "connections_opened": 0,
+            "connections_reused": 0
+        }
+
+        adapter = Sender._adapter
+        if adapter is None:
+            return stats
+
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
                 continue
+            stats["requests"] += pool.num_requests
+            stats["connections_opened"] += pool.num_connections
 
-            Sender._send_with_retry(batch)
+        stats["connections_reused"] = max(
+            0, stats["requests"] - stats["connections_opened"]
+        )
+        return stats
 
     @staticmethod
-    def _send_with_retry(batch):
+    def _content_encoding():
+        if not Sender._encoding_negotiated:
+            Sender._encoding = choose_encoding(AgentConfig.compression)
+            Sender._encoding_negotiated = True
+        return Sender._encoding
 
-        if not AgentConfig.api_secret:
+    @staticmethod
+    def _batch_ready():
+        depth = EventQueue.size()
+        return (
+            depth >= AgentConfig.flush_max_events
+            or depth * Sender._avg_event_bytes >= AgentConfig.flush_max_bytes
+        )
+
+    @staticmethod
+    def _update_wake_threshold():
+        by_bytes = AgentConfig.flush_max_bytes / Sender._avg_event_bytes
+        EventQueue.set_wake_threshold(min(AgentConfig.flush_max_events, by_bytes))
+
+    @staticmethod
+    def _flush():
+
+        batch = EventQueue.flush()
+        if not batch or not AgentConfig.api_secret:
+            return
+
+        if Sender._hand_off(batch):
+            return
+
+        Sender._outbox.extend(Sender._encode_batch(batch))
+        Sender._drain_outbox()
+
+    @staticmethod
+    def _hand_off(batch=(), summaries=None):
+        # another local process ships for us: the daemon or the host's
+        # pre-fork forwarder. Events are still serialized here, in the
+        # app process. False = not reachable, ship directly.
+        if AgentConfig.transport == "daemon":
+            return DaemonClient.forward(batch, summaries)
+        if AgentConfig.spool_enabled:
+            return Spool.forward(batch, summaries)
+        return False
+
+    @staticmethod
+    def _encode_batch(batch):
+        # sampled-out counts are drained once per flush and ride on the
+        # first body only, however the batch gets split
+        sampled_out = Sampler.drain_dropped()
+
+        bodies = []
+        step = AgentConfig.max_batch_events
+        for start in range(0, len(batch), step):
+            bodies += Sender._encode_chunk(batch[start:start + step], sampled_out)
+            sampled_out = None
+        return bodies
+
+    @staticmethod
+    def _encode_chunk(chunk, sampled_out=None):
+
+        body = Sender._build_body(chunk, sampled_out=sampled_out)
+
+        # split oversized batches in halves until they fit
+        if len(body) > AgentConfig.max_batch_bytes and len(chunk) > 1:
+            middle = len(chunk) // 2
+            return (
+                Sender._encode_chunk(chunk[:middle], sampled_out)
+                + Sender._encode_chunk(chunk[middle:])
+            )
+
+        Sender._avg_event_bytes = (
+            0.8 * Sender._avg_event_bytes + 0.2 * (len(body) / len(chunk))
+        )
+        Sender._update_wake_threshold()
+
+        return [body]
+
+    @staticmethod
+    def _drain_outbox():
+        # encoded bodies wait in the outbox, so shutdown() can take over
+        # whatever the thread has not posted yet
+        while not Sender._stopping.is_set():
+            try:
+                body = Sender._outbox.popleft()
+            except IndexError:
+                return
+            Sender._posting = body
+            try:
+                Sender._deliver(body)
+            finally:
+                Sender._posting = None
+
+    @staticmethod
+    def _ship_summaries():
+
+        if not AgentConfig.api_secret or not MetricsAggregator.has_data():
             return
 
+        summaries = MetricsAggregator.snapshot()
+        if Sender._hand_off(summaries=summaries):
+            return
+
+        Sender._outbox.append(Sender._summary_body(summaries))
+        Sender._drain_outbox()
+
+    @staticmethod
+    def _summary_body(summaries):
+        # a summaries-only send is a flush of its own
+        return Sender._build_body([], summaries, Sampler.drain_dropped())
+
+    @staticmethod
+    def _build_body(batch, summaries=None, sampled_out=None):
+
+        batch_meta = {
+            "sdk_version": AgentConfig.sdk_version,
+            "schema_version": AgentConfig.schema_version,
+            "sent_at": current_utc(),
+            "event_count": len(batch),
+            "project": AgentConfig.project,
+            "environment": AgentConfig.environment
+        }
+
+        if AgentConfig.schema_version != "1.0":
+            batch_meta["identity"] = Identity.collect()
+
+        if sampled_out:
+            batch_meta["sampled_out"] = sampled_out
+
         payload = {
-            "batch_meta": {
-                "sdk_version": AgentConfig.sdk_version,
-                "schema_version": AgentConfig.schema_version,
-                "sent_at": current_utc(),
-                "event_count": len(batch),
-                "project": AgentConfig.project,
-                "environment": AgentConfig.environment
-            },
+            "batch_meta": batch_meta,
             "events": batch
         }
 
-        # Stable JSON body
-        body = json.dumps(payload, separators=(",", ":"), sort_keys=True)
+        if summaries:
+            payload["summaries"] = summaries
+
+        # encoded exactly once, these bytes are signed and sent as-is
+        start = time.perf_counter_ns()
+        body = serializer.dumps(payload)
+        Overhead.record("serialize", time.perf_counter_ns() - start)
+        return body
+
+    @staticmethod
+    def _spill_store():
+        if Sender._spill is None:
+            Sender._spill = SpillStore(
+                Path(AgentConfig.spill_dir or default_spill_dir())
+                / spill_namespace(AgentConfig.endpoint, AgentConfig.api_key),
+                max_bytes=AgentConfig.spill_dir_max_bytes,
+                segment_bytes=AgentConfig.spill_segment_bytes
+            )
+        return Sender._spill
+
+    @staticmethod
+    def _deliver(body, attempt=0):
+
+        if Sender._post(body):
+            Sender._healthy = True
+            Sender._stats["batches_sent"] += 1
+            return True
+
+        Sender._healthy = False
+        Sender._stats["send_failures"] += 1
+        attempt += 1
+
+        # out of attempts or too much in memory: park it on disk
+        if attempt >= Sender.RETRY_LIMIT or len(Sender._retries) >= AgentConfig.max_pending_retries:
+            if Sender._spill_store().append(body):
+                Sender._stats["batches_spilled"] += 1
+            return False
+
+        due = time.monotonic() + Sender.BASE_BACKOFF * (2 ** (attempt - 1))
+        heapq.heappush(Sender._retries, (due, next(Sender._retry_seq), attempt, body))
+        Sender._stats["retries_scheduled"] += 1
+        return False
+
+    @staticmethod
+    def _process_retries():
+
+        now = time.monotonic()
+        while Sender._retries and Sender._retries[0][0] <= now:
+            _, _, attempt, body = heapq.heappop(Sender._retries)
+            Sender._deliver(body, attempt)
+
+        # collector is reachable again: replay one spilled segment per pass
+        if Sender._healthy and not Sender._retries:
+            Sender._replay_spill()
+
+    @staticmethod
+    def _replay_spill():
+
+        # nothing to sign with: leave the segments for a configured process
+        if not AgentConfig.api_secret:
+            return
+
+        replay = Sender._replay
+        if replay is None:
+            store = Sender._spill_store()
+            if not store.has_pending():
+                return
+
+            claimed, bodies = store.claim()
+            if claimed is None:
+                return
+            replay = Sender._replay = [claimed, deque(bodies), 0]
+
+        # a few bodies per pass, so new batches and periodic work are
+        # never stuck behind a whole segment of 3 s posts
+        bodies = replay[1]
+        for _ in range(AgentConfig.spill_replay_batches):
+            if not bodies:
+                break
+            # a failure re-enters the retry schedule (and the spill after
+            # that), and replay waits for the collector to recover
+            if not Sender._deliver(bodies.popleft()):
+                break
+            replay[2] += 1
+            Sender._stats["batches_replayed"] += 1
+
+        if not bodies:
+            Sender._replay = None
+            Sender._spill_store().release(replay[0], replay[2])
+
+    @staticmethod
+    def _take_replay():
+        # shutdown: the unsent rest of the claimed segment goes with the
+        # final bodies, and is spilled again if it misses the deadline
+        replay, Sender._replay = Sender._replay, None
+        if replay is None:
+            return []
+        Sender._spill_store().release(replay[0], replay[2])
+        return list(replay[1])
+
+    @staticmethod
+    def delivery_stats():
+        # reporting never creates the spill store (and its directory)
+        spill = Sender._spill
+        stats = dict(Sender._stats)
+        stats["pending_retries"] = len(Sender._retries)
+        stats["spill"] = spill.stats() if spill is not None else SpillStore.empty_stats()
+        if AgentConfig.transport == "daemon":
+            stats["daemon"] = DaemonClient.stats()
+        return stats
+
+    @staticmethod
+    def prepare_request(body):
+
+        timestamp = current_utc()
+
+        # signed over the uncompressed body
+        signature = generate_signature(
+            AgentConfig.api_secret,
+            timestamp,
+            body
+        )
+
+        headers = {
+            "X-API-KEY": AgentConfig.api_key,
+            "X-TIMESTAMP": timestamp,
+            "X-SIGNATURE": signature,
+            "Content-Type": "application/json"
+        }
+
+        data = body
+        encoding = Sender._content_encoding()
+        if encoding and len(body) >= AgentConfig.compression_min_bytes:
+            data = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+        return data, headers
 
-        attempt = 0
+    @staticmethod
+    def renegotiate(status_code, headers, response_headers):
+        # collector can't decode this encoding: pick another, True = resend
+        encoding = headers.get("Content-Encoding")
+        if status_code != 415 or not encoding:
+            return False
 
-        while attempt < Sender.RETRY_LIMIT:
+        Sender._encoding = choose_encoding(
+            AgentConfig.compression,
+            response_headers.get("Accept-Encoding", "")
+        )
+        if Sender._encoding == encoding:
+            Sender._encoding = None
+        return True
+
+    @staticmethod
+    def _post(body, timeout=3):
+
+        start = time.perf_counter_ns()
+        try:
+            # second pass only happens after a 415 renegotiation
+            for _ in range(2):
+                try:
+                    data, headers = Sender.prepare_request(body)
+
+                    response = Sender._get_session().post(
+                        AgentConfig.endpoint,
+                        data=data,
+                        headers=headers,
+                        timeout=timeout
+                    )
+
+                    if Sender.renegotiate(response.status_code, headers, response.headers):
+                        continue
+
+                    Overhead.add_bytes(len(body), len(data))
+                    return response.status_code < 500
+
+                except Exception:
+                    return False
+
+            return False
+
+        finally:
+            Overhead.record("send", time.perf_counter_ns() - start)
+
+    # ----------------------------
+    # Shutdown
+    # ----------------------------
+    @staticmethod
+    def shutdown(timeout=5.0):
+
+        deadline = time.monotonic() + timeout
+
+        # the sender thread stops after the body it is posting; everything
+        # it has not taken yet is sent from here, in parallel
+        Sender._stopping.set()
+        EventQueue.stop_waiting()
+
+        thread = Sender._thread
+        if thread is threading.current_thread():
+            thread = None
+
+        unsent = []
+
+        # second pass picks up what the thread encoded while we were sending
+        for _ in range(2):
+            bodies = Sender._pending_bodies()
+            sent = Sender._send_parallel(bodies, deadline)
+
+            Sender._stats["batches_sent"] += sum(sent)
+            unsent += [body for body, ok in zip(bodies, sent) if not ok]
+
+            if thread is not None:
+                thread.join(max(0, deadline - time.monotonic()))
+
+        # whatever missed the deadline is replayed by the next process (a
+        # send still in flight is spilled too: a duplicate beats a loss)
+        if thread is not None and thread.is_alive() and Sender._posting is not None:
+            unsent.append(Sender._posting)
+
+        for body in unsent:
+            if Sender._spill_store().append(body):
+                Sender._stats["batches_spilled"] += 1
+
+        return not unsent
+
+    @staticmethod
+    def _pending_bodies():
+
+        bodies = Sender._take_outbox()
+
+        batch = EventQueue.flush()
+        if batch and AgentConfig.api_secret and not Sender._hand_off(batch):
+            bodies += Sender._encode_batch(batch)
+
+        if AgentConfig.api_secret and MetricsAggregator.has_data():
+            summaries = MetricsAggregator.snapshot()
+            if not Sender._hand_off(summaries=summaries):
+                bodies.append(Sender._summary_body(summaries))
+
+        # bodies still waiting for their backoff get one last try
+        bodies += [entry[3] for entry in Sender._retries]
+        Sender._retries = []
+        bodies += Sender._take_replay()
+
+        return bodies
+
+    @staticmethod
+    def _take_outbox():
+        bodies = []
+        while True:
             try:
-                timestamp = current_utc()
+                bodies.append(Sender._outbox.popleft())
+            except IndexError:
+                return bodies
 
-                signature = generate_signature(
-                    AgentConfig.api_secret,
-                    timestamp,
-                    body
-                )
+    @staticmethod
+    def _send_parallel(bodies, deadline):
 
-                headers = {
-                    "X-API-KEY": AgentConfig.api_key,
-                    "X-TIMESTAMP": timestamp,
-                    "X-SIGNATURE": signature,
-                    "Content-Type": "application/json"
-                }
-
-                response = requests.post(
-                    AgentConfig.endpoint,
-                    data=body,
-                    headers=headers,
-                    timeout=3
-                )
+        results = [False] * len(bodies)
+        if not bodies:
+            return results
+
+        claims = itertools.count()  # next() is atomic, no lock needed
 
-                if response.status_code < 500:
+        def worker():
+            while True:
+                index = next(claims)
+                remaining = deadline - time.monotonic()
+                if index >= len(bodies) or remaining <= 0:
                     return
+                results[index] = Sender._post(bodies[index], timeout=min(3, remaining))
+
+        # daemon threads, so a hung connection can't hold up interpreter exit
+        workers = [
+            threading.Thread(target=worker, daemon=True)
+            for _ in range(min(AgentConfig.http_pool_size, len(bodies)))
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join(max(0, deadline - time.monotonic()))
+
+        return list(results)
+
+    @staticmethod
+    def _after_fork_in_child():
+        # sockets, locks and pending bodies are the parent's; the sender
+        # thread did not survive the fork, so a started sender restarts
+        # on the child's first push, not here in the fork handler
+        Sender._session = None
+        Sender._adapter = None
+        Sender._session_lock = threading.Lock()
+        Sender._retries = []
+        Sender._spill = None
+        Sender._replay = None   # the parent's claim
+        Sender._healthy = True
+        Sender._stats = dict.fromkeys(Sender._stats, 0)
+        Sender._stopping = threading.Event()
+        Sender._outbox = deque()
+        Sender._posting = None
+
+        if Sender._thread is not None:
+            Sender._thread = None
+            EventQueue.on_next_push(Sender._start_thread)
 
-            except Exception:
-                pass
 
-            backoff_time = Sender.BASE_BACKOFF * (2 ** attempt)
-            time.sleep(backoff_time)
-            attempt += 1
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Sender._after_fork_in_child)
@@ -0,0 +1,96 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(obj):
+    # Event records turn into their wire dict here, in the sender thread
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return str(obj)
+
+
+# Fastest installed JSON backend: orjson -> msgspec -> stdlib.
+# dumps() always returns the UTF-8 body bytes that get signed and sent.
+
+def _stdlib_dumps(obj, skipkeys=False) -> bytes:
+    try:
+        return json.dumps(
+            obj,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=_default,
+            skipkeys=skipkeys
+        ).encode()
+    except UnicodeEncodeError:
+        # lone surrogates (surrogateescape-decoded paths, log text) have
+        # no UTF-8 form: escape them as \udcxx like the old encoder did
+        return json.dumps(
+            obj,
+            separators=(",", ":"),
+            default=_default,
+            skipkeys=skipkeys
+        ).encode()
+
+
+def _dumps_parts(obj) -> bytes:
+    # The fast backends reject what stdlib json takes (ints wider than 64
+    # bits, lone surrogates). The batch is already out of the queue, so
+    # only the event that fails is re-encoded, with stdlib json, and keys
+    # neither accepts (tuples...) are skipped rather than losing it.
+    if isinstance(obj, dict):
+        return b"{" + b",".join(
+            _stdlib_dumps(key if isinstance(key, str) else str(key))
+            + b":" + dumps(value)
+            for key, value in obj.items()
+        ) + b"}"
+    if isinstance(obj, (list, tuple)):
+        return b"[" + b",".join(dumps(item) for item in obj) + b"]"
+    return _stdlib_dumps(obj, skipkeys=True)
+
+
+if orjson is not None:
+
+    BACKEND = "orjson"
+
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj, default=_default, option=_OPTIONS)
+        except TypeError:
+            return _dumps_parts(obj)
+
+    loads = orjson.loads
+
+elif msgspec is not None:
+
+    BACKEND = "msgspec"
+
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj) -> bytes:
+        try:
+            return _encoder.encode(obj)
+        except (TypeError, ValueError, OverflowError, msgspec.EncodeError):
+            return _dumps_parts(obj)
+
+    loads = _decoder.decode
+
+else:
+
+    BACKEND = "json"
+
+    dumps = _stdlib_dumps
+
+    loads = json.loads
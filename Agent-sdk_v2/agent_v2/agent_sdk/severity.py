@@ -4,7 +4,8 @@ SEVERITY_MAP = {
     "HTTP_CALL": "LOW",
     "INCOMING_REQUEST": "LOW",
     "DB_QUERY": "MEDIUM",
-    "LOG": "LOW"
+    "LOG": "LOW",
+    "AGENT_HEALTH": "LOW"
 }
 
 
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+SEGMENT_SUFFIX = ".seg"
+CLAIM_SUFFIX = ".replay"
+RESCAN_INTERVAL = 30  # seconds, picks up segments left by other processes
+
+
+def default_spill_dir():
+    return Path(tempfile.gettempdir()) / "agent_sdk_spill"
+
+
+def spill_namespace(endpoint, api_key):
+    # Processes share a spill directory only when they ship to the same
+    # collector with the same key: a replayed body is re-signed with the
+    # replaying process's secret and posted to its endpoint.
+    return hashlib.sha256(f"{endpoint}\0{api_key}".encode()).hexdigest()[:16]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SpillStore:
+
+    # Failed batch bodies as append-only segment files, one body per line,
+    # in a directory per (endpoint, api_key), see spill_namespace.
+    # Segment names start with time_ns so sorting gives replay order.
+    # Replay claims a segment by renaming it, so several processes can
+    # share the directory without sending the same batch twice.
+
+    def __init__(self, directory=None, max_bytes=100 * 1024 * 1024,
+                 segment_bytes=4 * 1024 * 1024):
+
+        self.directory = Path(directory) if directory else default_spill_dir()
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_bytes = 0
+        self._seq = 0
+        self._next_scan = 0.0
+        self._pending = False
+
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        self._recover_claims()
+
+    # ----------------------------
+    # Segment bookkeeping
+    # ----------------------------
+    def _segments(self):
+        try:
+            return sorted(self.directory.glob("*" + SEGMENT_SUFFIX))
+        except OSError:
+            return []
+
+    def _recover_claims(self):
+        # segments claimed by a process that died mid-replay go back in line
+        try:
+            claims = list(self.directory.glob(f"*{CLAIM_SUFFIX}-*"))
+        except OSError:
+            return
+
+        for path in claims:
+            try:
+                pid = int(path.name.rsplit("-", 1)[1])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.rename(path, path.with_name(path.name.split(CLAIM_SUFFIX)[0]))
+                except OSError:
+                    pass
+
+    def _rotate(self):
+        self._seq += 1
+        self._active = self.directory / (
+            f"{time.time_ns():020d}-{os.getpid()}-{self._seq}{SEGMENT_SUFFIX}"
+        )
+        self._active_bytes = 0
+        self._enforce_limit()
+
+    def _enforce_limit(self):
+        # keep room for the segment being written, oldest segments go first
+        segments = [s for s in self._segments() if s != self._active]
+        sizes = {}
+        for segment in segments:
+            try:
+                sizes[segment] = segment.stat().st_size
+            except OSError:
+                sizes[segment] = 0
+
+        total = sum(sizes.values())
+        while segments and total + self.segment_bytes > self.max_bytes:
+            oldest = segments.pop(0)
+            try:
+                with open(oldest, "rb") as f:
+                    lost = sum(1 for _ in f)
+                os.remove(oldest)
+            except OSError:
+                continue
+            self.dropped += lost
+            total -= sizes[oldest]
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def append(self, body: bytes):
+
+        data = body + b"\n"
+
+        with self._lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+
+                if self._active is None or self._active_bytes + len(data) > self.segment_bytes:
+                    self._rotate()
+
+                with open(self._active, "ab") as f:
+                    f.write(data)
+
+            except OSError:
+                self.dropped += 1
+                return False
+
+            self._active_bytes += len(data)
+            self.spilled += 1
+            self._pending = True
+
+        return True
+
+    def has_pending(self):
+        if self._pending:
+            return True
+
+        now = time.monotonic()
+        if now >= self._next_scan:
+            self._next_scan = now + RESCAN_INTERVAL
+            self._pending = bool(self._segments())
+
+        return self._pending
+
+    # take the oldest segment for replay: (handle, bodies) or (None, [])
+    def claim(self):
+
+        with self._lock:
+            for segment in self._segments():
+
+                if segment == self._active:
+                    if not self._active_bytes:
+                        continue
+                    # seal our own segment, later spills start a new one
+                    self._active = None
+
+                else:
+                    # another process may still be appending to it
+                    try:
+                        if segment.stat().st_mtime > time.time() - 2:
+                            continue
+                    except OSError:
+                        continue
+
+                claimed = segment.with_name(f"{segment.name}{CLAIM_SUFFIX}-{os.getpid()}")
+                try:
+                    os.rename(segment, claimed)
+                except OSError:
+                    continue  # someone else claimed it
+
+                try:
+                    with open(claimed, "rb") as f:
+                        bodies = [line.rstrip(b"\n") for line in f if line.strip()]
+                except OSError:
+                    bodies = []
+
+                return claimed, bodies
+
+            self._pending = False
+            return None, []
+
+    def release(self, claimed, replayed):
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.replayed += replayed
+
+    @staticmethod
+    def empty_stats():
+        # before anything touched the directory
+        return {"spilled": 0, "replayed": 0, "dropped": 0, "segments": 0, "disk_bytes": 0}
+
+    def stats(self):
+        disk_bytes = 0
+        segments = self._segments()
+        for segment in segments:
+            try:
+                disk_bytes += segment.stat().st_size
+            except OSError:
+                pass
+
+        return {
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "segments": len(segments),
+            "disk_bytes": disk_bytes
+        }
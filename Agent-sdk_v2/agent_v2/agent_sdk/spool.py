@@ -0,0 +1,301 @@
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from .config import AgentConfig
+from .queue import EventQueue
+from .sampling import Sampler
+from .metrics import MetricsAggregator
+from . import serializer
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): every process ships directly
+    fcntl = None
+
+
+FRAME_HEADER = struct.Struct("!I")   # big-endian body length
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+def default_spool_socket():
+    return Path(tempfile.gettempdir()) / "agent_sdk_spool.sock"
+
+
+# Shared with the local daemon (see daemon.py): events leave this process
+# as dicts and are shipped under another process's batch identity.
+def tag_forwarded(event):
+    record = event.to_dict() if hasattr(event, "to_dict") else event
+    if AgentConfig.schema_version != "1.0":
+        record["identity"] = {"process_id": os.getpid()}
+    return record
+
+
+def ingest_frame(frame):
+
+    events = frame.get("events") or []
+
+    # already sampled by the sending process, straight into our queue
+    for event in events:
+        EventQueue.push_raw(event)
+
+    Sampler.add_dropped(frame.get("sampled_out") or {})
+
+    summaries = frame.get("summaries")
+    if summaries:
+        MetricsAggregator.add_forwarded(summaries)
+
+    return len(events)
+
+
+class Spool:
+
+    # Pre-fork servers: every process on the host hands its flushed
+    # events to one forwarder over a Unix socket, and only the forwarder
+    # talks to the collector. The forwarder is whichever process holds
+    # the flock on "<socket>.lock"; when it dies the lock is released and
+    # the next worker that fails to reach it takes over.
+
+    _lock_fd = None
+    _listener = None
+    _conn = None
+    _is_forwarder = False
+
+    _stats = {
+        "frames_forwarded": 0,
+        "frames_received": 0,
+        "events_received": 0,
+        "forward_failures": 0
+    }
+
+    @classmethod
+    def socket_path(cls):
+        return Path(AgentConfig.spool_socket) if AgentConfig.spool_socket else default_spool_socket()
+
+    @classmethod
+    def start(cls):
+        cls.elect()
+
+    @classmethod
+    def is_forwarder(cls):
+        return cls._is_forwarder
+
+    # ----------------------------
+    # Forwarder election
+    # ----------------------------
+    @classmethod
+    def elect(cls):
+
+        if cls._is_forwarder:
+            return True
+
+        if fcntl is None or not hasattr(socket, "AF_UNIX"):
+            return False
+
+        path = cls.socket_path()
+
+        try:
+            fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            return False
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)  # someone else is the forwarder
+            return False
+
+        try:
+            # we hold the lock, so a socket file still there is stale
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(str(path))
+            listener.listen(128)
+        except OSError:
+            os.close(fd)
+            return False
+
+        cls._lock_fd = fd
+        cls._listener = listener
+        cls._is_forwarder = True
+        cls._close_conn()
+
+        thread = threading.Thread(target=cls._serve, args=(listener,), daemon=True)
+        thread.start()
+        return True
+
+    # ----------------------------
+    # Worker side
+    # ----------------------------
+    @classmethod
+    def _connect(cls):
+
+        if cls._conn is not None:
+            return cls._conn
+
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(2)  # a wedged forwarder must not stall the sender
+        try:
+            conn.connect(str(cls.socket_path()))
+        except OSError:
+            conn.close()
+            return None
+
+        cls._conn = conn
+        return conn
+
+    @classmethod
+    def _close_conn(cls):
+        conn, cls._conn = cls._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    # False = not forwarded, the caller ships it directly
+    @classmethod
+    def forward(cls, events=(), summaries=None):
+
+        if cls._is_forwarder or not hasattr(socket, "AF_UNIX"):
+            return False
+
+        sampled_out = Sampler.drain_dropped()
+
+        frame = {"events": [tag_forwarded(event) for event in events]}
+        if sampled_out:
+            frame["sampled_out"] = sampled_out
+        if summaries:
+            frame["summaries"] = summaries
+
+        body = serializer.dumps(frame)
+        data = FRAME_HEADER.pack(len(body)) + body
+
+        # a stale connection (forwarder restarted) gets one reconnect
+        for _ in range(2):
+            conn = cls._connect()
+            if conn is None:
+                break
+            try:
+                conn.sendall(data)
+                cls._stats["frames_forwarded"] += 1
+                return True
+            except OSError:
+                cls._close_conn()
+
+        cls._stats["forward_failures"] += 1
+        Sampler.add_dropped(sampled_out)
+
+        # forwarder is gone: take over if nobody else has yet
+        cls.elect()
+        return False
+
+    # ----------------------------
+    # Forwarder side
+    # ----------------------------
+    @classmethod
+    def _serve(cls, listener):
+
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        pending = {}
+
+        while True:
+            try:
+                for key, _ in selector.select():
+                    sock = key.fileobj
+
+                    if sock is listener:
+                        conn, _ = listener.accept()
+                        conn.setblocking(False)
+                        selector.register(conn, selectors.EVENT_READ)
+                        pending[conn] = bytearray()
+                        continue
+
+                    try:
+                        chunk = sock.recv(256 * 1024)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        chunk = b""
+
+                    buffer = pending[sock]
+                    if chunk:
+                        buffer += chunk
+                        chunk = cls._consume(buffer)
+
+                    # closed, or a corrupt frame: drop the connection
+                    if not chunk:
+                        selector.unregister(sock)
+                        pending.pop(sock, None)
+                        sock.close()
+
+            except Exception:
+                time.sleep(1)  # never spin on unexpected errors
+
+    @classmethod
+    def _consume(cls, buffer):
+
+        while len(buffer) >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack_from(buffer)
+            if size > MAX_FRAME_BYTES:
+                return False
+
+            end = FRAME_HEADER.size + size
+            if len(buffer) < end:
+                break
+
+            frame = bytes(buffer[FRAME_HEADER.size:end])
+            del buffer[:end]
+
+            try:
+                cls._ingest(serializer.loads(frame))
+            except Exception:
+                pass
+
+        return True
+
+    @classmethod
+    def _ingest(cls, frame):
+        cls._stats["events_received"] += ingest_frame(frame)
+        cls._stats["frames_received"] += 1
+
+    @classmethod
+    def stats(cls):
+        return {"forwarder": cls._is_forwarder, **cls._stats}
+
+    # ----------------------------
+    # Fork handling
+    # ----------------------------
+    @classmethod
+    def _after_fork_in_child(cls):
+        # the parent keeps the lock and listener, the child only forwards.
+        # Closing our copies leaves the parent's flock in place.
+        if cls._listener is not None:
+            try:
+                cls._listener.close()
+            except OSError:
+                pass
+        if cls._lock_fd is not None:
+            try:
+                os.close(cls._lock_fd)
+            except OSError:
+                pass
+
+        cls._listener = None
+        cls._lock_fd = None
+        cls._is_forwarder = False
+        cls._close_conn()  # our own connection, the parent's stays open
+        cls._stats = dict.fromkeys(cls._stats, 0)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Spool._after_fork_in_child)
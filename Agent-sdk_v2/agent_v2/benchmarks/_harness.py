@@ -0,0 +1,73 @@
+"""
+Shared timing helpers for the benchmark suite (see suite.py).
+
+Every helper returns the best-of-`repeat` cost in nanoseconds per
+operation; best-of filters scheduler noise better than the mean.
+"""
+
+import sys
+import threading
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from agent_sdk.queue import EventQueue, RingBuffer  # noqa: E402
+
+
+def measure(func, number, repeat=5, setup=None, ops=1):
+    # `setup` runs untimed before each repeat (e.g. draining the queue)
+    best = min(
+        timeit.repeat(func, setup=setup or (lambda: None), number=number, repeat=repeat)
+    )
+    return best / (number * ops) * 1e9
+
+
+def measure_each(prepare, func, number, repeat=5):
+    # `prepare` runs untimed before every single call
+    best = None
+    for _ in range(repeat):
+        total = 0
+        for _ in range(number):
+            prepare()
+            start = time.perf_counter_ns()
+            func()
+            total += time.perf_counter_ns() - start
+        best = total if best is None else min(best, total)
+    return best / number
+
+
+def measure_threaded(threads, per_thread, func, repeat=5, setup=None):
+    # all threads start together on a barrier, thread start-up is untimed
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        barrier = threading.Barrier(threads + 1)
+
+        def worker():
+            barrier.wait()
+            for _ in range(per_thread):
+                func()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+
+        barrier.wait()
+        start = time.perf_counter_ns()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter_ns() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best / (threads * per_thread)
+
+
+def fresh_queue(capacity=1_000_000, buffer=None):
+    # large enough that benchmarks never measure the overflow path
+    EventQueue._buffer = buffer or RingBuffer(capacity)
+    EventQueue.set_filter(None)
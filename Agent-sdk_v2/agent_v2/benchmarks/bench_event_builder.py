@@ -0,0 +1,100 @@
+"""
+Per-event cost of build_event on the request thread.
+
+"before" rebuilds the pre-deferral event (ISO timestamp, uuid4 string and
+the nested dicts built eagerly), "after" is the current build_event, and
+"to_dict" is the formatting cost that moved to the sender thread.
+
+    python benchmarks/bench_event_builder.py
+"""
+
+import sys
+import timeit
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from agent_sdk.config import AgentConfig  # noqa: E402
+from agent_sdk.event_builder import build_event, current_utc  # noqa: E402
+from agent_sdk.identity import Identity  # noqa: E402
+from agent_sdk.severity import get_severity  # noqa: E402
+
+
+DATA = {"path": "/api/items", "method": "GET", "status_code": 200}
+
+
+def eager_build_event(event_type, category, status, data, metrics=None):
+    return {
+        "meta": {
+            "sdk_version": AgentConfig.sdk_version,
+            "schema_version": AgentConfig.schema_version,
+            "timestamp": current_utc(),
+            "trace_id": str(uuid.uuid4()),
+            "project": AgentConfig.project,
+            "environment": AgentConfig.environment
+        },
+        "identity": Identity.collect(),
+        "event": {
+            "category": category,
+            "type": event_type,
+            "severity": get_severity(event_type),
+            "status": status,
+            "metrics": metrics or {},
+            "data": data
+        }
+    }
+
+
+def bench(stmt, number, repeat=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    return best / number * 1e9
+
+
+def main(number=100_000):
+
+    Identity.collect()
+    event = build_event("INCOMING_REQUEST", "APPLICATION", "SUCCESS", DATA, {"duration_ms": 3})
+
+    results = {
+        "before (eager)": bench(
+            lambda: eager_build_event(
+                "INCOMING_REQUEST", "APPLICATION", "SUCCESS", DATA, {"duration_ms": 3}
+            ),
+            number
+        ),
+        "after (deferred)": bench(
+            lambda: build_event(
+                "INCOMING_REQUEST", "APPLICATION", "SUCCESS", DATA, {"duration_ms": 3}
+            ),
+            number
+        ),
+        "to_dict (sender thread)": bench(event.to_dict, number)
+    }
+
+    for name, ns in results.items():
+        print(f"{name:<26} {ns:8.0f} ns/event")
+
+    return results
+
+
+# suite.py entry point: the current path only, the eager rebuild above is
+# a one-off comparison
+def benchmarks(quick=False):
+
+    number = 20_000 if quick else 100_000
+
+    Identity.collect()
+    event = build_event("INCOMING_REQUEST", "APPLICATION", "SUCCESS", DATA, {"duration_ms": 3})
+
+    yield "event.build_event", bench(
+        lambda: build_event(
+            "INCOMING_REQUEST", "APPLICATION", "SUCCESS", DATA, {"duration_ms": 3}
+        ),
+        number
+    )
+    yield "event.to_dict", bench(event.to_dict, number)
+
+
+if __name__ == "__main__":
+    main()
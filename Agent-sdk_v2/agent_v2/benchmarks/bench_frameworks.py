@@ -0,0 +1,110 @@
+"""
+One request through each framework's test client, with and without the
+agent middleware. Frameworks that are not installed are skipped.
+
+    python benchmarks/suite.py -k framework
+"""
+
+from _harness import measure, fresh_queue
+
+from agent_sdk.queue import EventQueue
+
+
+def _flask(instrumented):
+    from flask import Flask
+    from agent_sdk.integrations.flask import init_flask
+
+    app = Flask(__name__)
+
+    @app.route("/items/<int:item_id>")
+    def item(item_id):
+        return {"id": item_id}
+
+    if instrumented:
+        init_flask(app)
+
+    client = app.test_client()
+    return lambda: client.get("/items/7")
+
+
+def _fastapi(instrumented):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from agent_sdk.integrations.fastapi import init_fastapi
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        init_fastapi(app)
+
+    client = TestClient(app)
+    return lambda: client.get("/items/7")
+
+
+_django_configured = False
+
+
+def _django(instrumented):
+    global _django_configured
+
+    import django
+    from django.conf import settings
+    from django.http import JsonResponse
+    from django.test import Client
+    from django.urls import path
+
+    def item(request, item_id):
+        return JsonResponse({"id": item_id})
+
+    urlpatterns = [path("items/<int:item_id>", item)]
+
+    if not _django_configured:
+        settings.configure(
+            DEBUG=False,
+            ALLOWED_HOSTS=["testserver"],
+            ROOT_URLCONF=__name__,
+            MIDDLEWARE=[],
+            SECRET_KEY="benchmark"
+        )
+        django.setup()
+        _django_configured = True
+
+    # the urlconf and middleware chain are read per handler
+    globals()["urlpatterns"] = urlpatterns
+    settings.MIDDLEWARE = (
+        ["agent_sdk.integrations.django.AgentDjangoMiddleware"] if instrumented else []
+    )
+
+    client = Client()
+    return lambda: client.get("/items/7")
+
+
+FRAMEWORKS = {
+    "flask": _flask,
+    "fastapi": _fastapi,
+    "django": _django
+}
+
+
+def benchmarks(quick=False):
+
+    number = 300 if quick else 2_000
+    fresh_queue()
+
+    for name, factory in FRAMEWORKS.items():
+        try:
+            bare = measure(factory(False), number)
+            agent = measure(factory(True), number, setup=EventQueue.flush)
+        except ImportError:
+            print(f"  skipped {name}: not installed")
+            continue
+
+        yield f"{name}.request bare", bare
+        yield f"{name}.request agent", agent
+        yield f"{name}.request overhead", max(0.0, agent - bare)
+
+    fresh_queue()
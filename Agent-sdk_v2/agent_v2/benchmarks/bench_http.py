@@ -0,0 +1,60 @@
+"""
+Outbound requests.Session calls against a local stand-in server, before
+and after install_http_patch. The difference is the instrumentation cost
+per call.
+
+    python benchmarks/suite.py -k http
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from _harness import measure, fresh_queue
+
+from agent_sdk.queue import EventQueue
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so we time requests not connects
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def benchmarks(quick=False):
+
+    from agent_sdk.network import install_http_patch
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/items?id=7"
+
+    number = 200 if quick else 1_000
+    session = requests.Session()
+    fresh_queue()
+
+    try:
+        plain = measure(lambda: session.get(url), number)
+        yield "http.request plain", plain
+
+        install_http_patch()
+        patched = measure(lambda: session.get(url), number, setup=EventQueue.flush)
+        yield "http.request patched", patched
+        yield "http.request overhead", max(0.0, patched - plain)
+
+    finally:
+        session.close()
+        server.shutdown()
+        fresh_queue()
@@ -0,0 +1,60 @@
+"""
+AgentLogHandler.emit for a plain record, one that needs IP masking and
+one carrying a traceback, plus a repeated record that dedup suppresses.
+
+    python benchmarks/suite.py -k logging
+"""
+
+import logging
+import sys
+
+from _harness import measure, fresh_queue
+
+from agent_sdk.config import AgentConfig
+from agent_sdk.logging_capture import AgentLogHandler, LogDedup
+from agent_sdk.queue import EventQueue
+
+
+def _record(msg, args=(), exc_info=None):
+    return logging.LogRecord(
+        "app.orders", logging.ERROR, __file__, 42, msg, args, exc_info
+    )
+
+
+def _exc_info():
+    try:
+        raise ValueError("payment declined")
+    except ValueError:
+        return sys.exc_info()
+
+
+def benchmarks(quick=False):
+
+    number = 5_000 if quick else 20_000
+    handler = AgentLogHandler()
+    fresh_queue()
+
+    records = {
+        "plain": _record("order %s failed", ("A-1042",)),
+        "with ip": _record("upstream 10.0.3.17 refused order %s", ("A-1042",)),
+        "with traceback": _record("order failed", exc_info=_exc_info())
+    }
+
+    # the same record over and over would only measure the dedup path
+    dedup, AgentConfig.log_dedup = AgentConfig.log_dedup, False
+    try:
+        for name, record in records.items():
+            yield f"logging.emit {name}", measure(
+                lambda record=record: handler.emit(record), number, setup=EventQueue.flush
+            )
+    finally:
+        AgentConfig.log_dedup = dedup
+
+    if AgentConfig.log_dedup:
+        record = records["plain"]
+        yield "logging.emit repeated (deduped)", measure(
+            lambda: handler.emit(record), number, setup=EventQueue.flush
+        )
+        LogDedup.sweep()
+
+    fresh_queue()
@@ -0,0 +1,57 @@
+"""
+EventQueue push / flush, single-threaded and contended.
+
+    python benchmarks/suite.py -k queue
+"""
+
+from _harness import measure, measure_each, measure_threaded, fresh_queue
+
+from agent_sdk.event_builder import build_event
+from agent_sdk.queue import EventQueue, ShardedBuffer
+
+
+EVENT = build_event(
+    "INCOMING_REQUEST", "APPLICATION", "SUCCESS",
+    {"path": "/api/items", "method": "GET", "status_code": 200},
+    {"duration_ms": 3}
+)
+
+
+def _push():
+    EventQueue.push(EVENT)
+
+
+def _fill(count):
+    def prepare():
+        EventQueue.flush()
+        for _ in range(count):
+            EventQueue.push_raw(EVENT)
+    return prepare
+
+
+def benchmarks(quick=False):
+
+    number = 20_000 if quick else 100_000
+    per_thread = 5_000 if quick else 20_000
+
+    fresh_queue()
+    yield "queue.push", measure(_push, number, setup=EventQueue.flush)
+
+    for threads in (4, 8):
+        fresh_queue()
+        yield f"queue.push x{threads} threads", measure_threaded(
+            threads, per_thread, _push, setup=EventQueue.flush
+        )
+
+        fresh_queue(buffer=ShardedBuffer(per_thread * 2 * threads))
+        yield f"queue.push sharded x{threads} threads", measure_threaded(
+            threads, per_thread, _push, setup=EventQueue.flush
+        )
+
+    fresh_queue()
+    for count in (100, 1000):
+        yield f"queue.flush {count} events", measure_each(
+            _fill(count), EventQueue.flush, 50 if quick else 200
+        )
+
+    fresh_queue()
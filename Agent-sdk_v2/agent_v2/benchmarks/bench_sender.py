@@ -0,0 +1,43 @@
+"""
+Sender batch encoding (serialize) and request preparation (sign and
+compress) at 10 / 100 / 1000 events, per batch.
+
+    python benchmarks/suite.py -k sender
+"""
+
+from _harness import measure
+
+from agent_sdk.config import AgentConfig
+from agent_sdk.event_builder import build_event
+from agent_sdk.identity import Identity
+from agent_sdk.sender import Sender
+
+
+def _batch(size):
+    return [
+        build_event(
+            "INCOMING_REQUEST", "APPLICATION", "SUCCESS",
+            {"path": f"/api/items/{i}", "method": "GET", "status_code": 200},
+            {"duration_ms": i % 50}
+        )
+        for i in range(size)
+    ]
+
+
+def benchmarks(quick=False):
+
+    AgentConfig.api_key = AgentConfig.api_key or "benchmark-key"
+    AgentConfig.api_secret = AgentConfig.api_secret or "benchmark-secret"
+    Identity.collect()
+
+    for size in (10, 100, 1000):
+        batch = _batch(size)
+        body = Sender._build_body(batch)
+        number = max(5, (2_000 if not quick else 400) // size)
+
+        yield f"sender.serialize {size} events", measure(
+            lambda: Sender._build_body(batch), number
+        )
+        yield f"sender.sign+compress {size} events", measure(
+            lambda: Sender.prepare_request(body), number
+        )
@@ -0,0 +1,158 @@
+"""
+Hot-path benchmark suite with stored baselines.
+
+Runs every bench_*.py module in this directory (each exposes
+benchmarks(quick) yielding (name, ns_per_op)) and compares the results
+with baseline.json.
+
+    python benchmarks/suite.py                    # run all, compare
+    python benchmarks/suite.py -k queue -k sender # only matching modules
+    python benchmarks/suite.py --quick            # fewer iterations
+    python benchmarks/suite.py --save-baseline    # refresh baseline.json
+    python benchmarks/suite.py --fail-on-regression --threshold 15
+
+Baselines are machine-specific: refresh them on the machine you compare
+on before relying on the report.
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import _harness  # noqa: E402,F401  (puts agent_sdk on the path)
+
+
+BASELINE = HERE / "baseline.json"
+
+
+def discover():
+    return sorted(path.stem for path in HERE.glob("bench_*.py"))
+
+
+def run(selected, quick):
+
+    results = {}
+
+    for module_name in discover():
+        if selected and not any(key in module_name for key in selected):
+            continue
+
+        module = importlib.import_module(module_name)
+        if not hasattr(module, "benchmarks"):
+            continue
+
+        print(f"{module_name}")
+        for name, ns in module.benchmarks(quick=quick):
+            results[name] = round(ns, 1)
+            print(f"  {name:<40} {format_ns(ns):>12}")
+
+    return results
+
+
+def format_ns(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine()
+    }
+
+
+def save_baseline(results, path=BASELINE):
+    payload = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine": machine(),
+        "results": results
+    }
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n")
+
+
+def compare(results, baseline, threshold):
+
+    base = baseline.get("results", {})
+    regressions = []
+
+    print()
+    print(f"compared with baseline from {baseline.get('created', '?')}")
+    if baseline.get("machine") != machine():
+        print("  (recorded on a different machine / Python, expect noise)")
+
+    print(f"  {'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for name, ns in results.items():
+        if name not in base:
+            print(f"  {name:<40} {'-':>12} {format_ns(ns):>12} {'new':>8}")
+            continue
+
+        change = (ns - base[name]) / base[name] * 100 if base[name] else 0.0
+        flag = ""
+        # "overhead" rows are differences of two noisy numbers, report only
+        if change > threshold and not name.endswith("overhead"):
+            flag = "  REGRESSION"
+            regressions.append(name)
+
+        print(
+            f"  {name:<40} {format_ns(base[name]):>12} {format_ns(ns):>12} "
+            f"{change:+7.1f}%{flag}"
+        )
+
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="agent_sdk hot-path benchmarks")
+    parser.add_argument("-k", dest="selected", action="append", default=[],
+                        help="only run bench_*.py modules whose name contains this")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--json", type=Path, help="also write results here")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run(args.selected, args.quick)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("\nno baseline yet, run with --save-baseline")
+        return 0
+
+    regressions = compare(
+        results, json.loads(args.baseline.read_text()), args.threshold
+    )
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0f}%")
+        if args.fail_on_regression:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,17 @@
-from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 import hmac
 import hashlib
 import json
+import zlib
 from datetime import datetime, timezone
 import os
 import ipaddress
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 LOG_FILE = "events.json"
 
 app = FastAPI()
@@ -20,6 +26,9 @@ API_KEYS = {
 EVENT_STORE = []
 REPLAY_CACHE = set()
 
+SUPPORTED_ENCODINGS = ["gzip", "zstd"] if zstandard else ["gzip"]
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
 def persist_json(record):
     if not os.path.exists(LOG_FILE):
         with open(LOG_FILE, "w") as f:
@@ -48,6 +57,64 @@ def ip_allowed(client_ip: str, allowed_list: list[str]) -> bool:
     return False
 
 
+def gunzip(body_bytes):
+    # bounded like zstd below: a small bomb must not inflate unchecked
+    decompressor = zlib.decompressobj(wbits=31)
+    data = decompressor.decompress(body_bytes, MAX_BODY_BYTES)
+    if decompressor.unconsumed_tail or decompressor.unused_data or not decompressor.eof:
+        raise ValueError("gzip body too large, truncated or with trailing data")
+    return data
+
+
+def decode_body(body_bytes, content_encoding):
+
+    encoding = (content_encoding or "identity").strip().lower()
+
+    try:
+        if encoding == "identity":
+            return body_bytes
+
+        if encoding == "gzip":
+            return gunzip(body_bytes)
+
+        if encoding == "zstd" and zstandard:
+            return zstandard.ZstdDecompressor().decompress(
+                body_bytes, max_output_size=MAX_BODY_BYTES
+            )
+
+    except Exception:
+        raise HTTPException(400, "Invalid compressed body")
+
+    raise HTTPException(
+        415,
+        "Unsupported Content-Encoding",
+        headers={"Accept-Encoding": ", ".join(SUPPORTED_ENCODINGS)}
+    )
+
+
+# fields that schema 2.0 sends once in batch_meta instead of per event
+BATCH_META_FIELDS = ("sdk_version", "schema_version", "project", "environment")
+
+
+def expand_events(payload):
+
+    batch_meta = payload.get("batch_meta", {})
+
+    if batch_meta.get("schema_version", "1.0") == "1.0":
+        return payload
+
+    shared_meta = {key: batch_meta.get(key) for key in BATCH_META_FIELDS}
+    identity = batch_meta.get("identity", {})
+
+    # restore the 1.0 event shape for storage and the CSV flattening
+    for event in payload.get("events", []):
+        event["meta"] = {**shared_meta, **event.get("meta", {})}
+        # events forwarded by pre-fork workers override process_id
+        event["identity"] = {**identity, **event.get("identity", {})}
+
+    return payload
+
+
 def verify_signature(api_key, timestamp, signature, body):
 
     if api_key not in API_KEYS:
@@ -55,11 +122,12 @@ def verify_signature(api_key, timestamp, signature, body):
 
     secret = API_KEYS[api_key]['secret']
 
-    message = timestamp + json.dumps(body, sort_keys=True)
+    # agents sign the raw (decompressed) body bytes
+    message = timestamp.encode() + body
 
     expected_signature = hmac.new(
         secret.encode(),
-        message.encode(),
+        message,
         hashlib.sha256
     ).hexdigest()
 
@@ -96,14 +164,18 @@ def verify_signature(api_key, timestamp, signature, body):
 @app.post("/api/logs")
 async def receive_logs(
     request: Request,
+    response: Response,
     x_api_key: str = Header(...),
     x_timestamp: str = Header(...),
-    x_signature: str = Header(...)
+    x_signature: str = Header(...),
+    content_encoding: str = Header(None)
 ):
 
-    # raw body for signature verification
-    body_bytes = await request.body()
-    body_str = body_bytes.decode()
+    # advertise what we can decode so agents can negotiate
+    response.headers["Accept-Encoding"] = ", ".join(SUPPORTED_ENCODINGS)
+
+    # raw body for signature verification (signed before compression)
+    body_bytes = decode_body(await request.body(), content_encoding)
 
     client_ip = request.client.host
 
@@ -119,12 +191,12 @@ async def receive_logs(
         x_api_key,
         x_timestamp,
         x_signature,
-        body_str
+        body_bytes
     )
 
     # safe JSON parsing
     try:
-        payload = json.loads(body_str)
+        payload = json.loads(body_bytes)
     except Exception:
         raise HTTPException(400, "Invalid JSON")
 
@@ -132,11 +204,18 @@ async def receive_logs(
     if payload.get("batch_meta", {}).get("event_count", 0) > 1000:
         raise HTTPException(413, "Batch too large")
 
+    payload = expand_events(payload)
+
     # capture real client IP
     client_ip = request.client.host
 
     print("\n📦 Received Batch from:", client_ip)
     print("Event Count:", payload["batch_meta"]["event_count"])
+    if payload["batch_meta"].get("sampled_out"):
+        print("Sampled out:", payload["batch_meta"]["sampled_out"])
+    for summary in payload.get("summaries", []):
+        print("Σ", summary["kind"], summary.get("route") or summary.get("table"),
+              "count:", summary["count"], "p95:", summary["p95_ms"])
     for event in payload["events"]:
         print("→", event["event"]["type"])
 
@@ -6,17 +6,17 @@ def detect_repeated(event):
     if event.get("level") != "error":
         return
 
-    recent = PatternStore.recent(60)
+    key = PatternStore.key(event)
+    if key is None:
+        return
 
-    same = [
-        e for e in recent
-        if e.get("message") == event.get("message")
-    ]
+    count = PatternStore.count(key, 60)
 
-    if len(same) > 5:
+    if count > 5:
         return {
             "type": "repeated_error",
             "severity": "medium",
             "message": event.get("message"),
-            "count": len(same)
-        }
\ No newline at end of file
+            "fingerprint": event.get("fingerprint"),
+            "count": count
+        }
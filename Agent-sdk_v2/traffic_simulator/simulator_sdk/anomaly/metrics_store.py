@@ -5,12 +5,58 @@ class PatternStore:
 
     EVENTS = deque(maxlen=500)
 
+    # fingerprint (or message, from agents that send none) -> (ts, count)
+    # pairs, so repeat counts are a lookup instead of a scan of EVENTS
+    BY_FINGERPRINT = {}
+    MAX_FINGERPRINTS = 1000
+
+    @staticmethod
+    def key(event):
+        return event.get("fingerprint") or event.get("message")
+
     @staticmethod
     def add(event):
         event["ts"] = time.time()
         PatternStore.EVENTS.append(event)
 
+        key = PatternStore.key(event)
+        if key is None:
+            return
+
+        seen = PatternStore.BY_FINGERPRINT.get(key)
+        if seen is None:
+            if len(PatternStore.BY_FINGERPRINT) >= PatternStore.MAX_FINGERPRINTS:
+                PatternStore._prune(event["ts"] - 60)
+            seen = PatternStore.BY_FINGERPRINT[key] = deque(maxlen=500)
+
+        # a deduplicated LOG event stands for repeat_count occurrences
+        seen.append((event["ts"], event.get("repeat_count") or 1))
+
+    @staticmethod
+    def _prune(cutoff):
+        by_fingerprint = PatternStore.BY_FINGERPRINT
+        for key, seen in list(by_fingerprint.items()):
+            if not seen or seen[-1][0] < cutoff:
+                del by_fingerprint[key]
+
+        # every key seen within the cutoff: drop the least recently seen
+        # one so the index stays bounded
+        if len(by_fingerprint) >= PatternStore.MAX_FINGERPRINTS:
+            oldest = min(by_fingerprint, key=lambda key: by_fingerprint[key][-1][0])
+            del by_fingerprint[oldest]
+
     @staticmethod
     def recent(seconds=60):
         now = time.time()
-        return [e for e in PatternStore.EVENTS if now - e["ts"] < seconds]
\ No newline at end of file
+        return [e for e in PatternStore.EVENTS if now - e["ts"] < seconds]
+
+    @staticmethod
+    def count(key, seconds=60):
+        cutoff = time.time() - seconds
+        total = 0
+        # newest last: stop at the first entry outside the window
+        for ts, count in reversed(PatternStore.BY_FINGERPRINT.get(key, ())):
+            if ts < cutoff:
+                break
+            total += count
+        return total